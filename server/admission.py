@@ -0,0 +1,231 @@
+# server/admission.py
+import math
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from flask import request, jsonify
+from config import (
+    ADMISSION_STT_CONCURRENCY, ADMISSION_STT_PER_USER, ADMISSION_STT_QUEUE,
+    ADMISSION_MT_CONCURRENCY, ADMISSION_MT_QUEUE, ADMISSION_QUEUE_TIMEOUT, ADMISSION_MT_WAIT,
+    DEGRADED_QUEUE_THRESHOLD, RAW_CHUNK_MAX_BYTES,
+)
+from metrics import inc, observe, register_gauge, timed
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after, reason):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Global + per-user concurrency limits in front of a bounded FIFO-ish wait queue.
+    Only the global limit queues: a user already at their per-user limit is rejected
+    at once, so one client can't fill the shared queue. Requests beyond the queue (or
+    waiting longer than queue_timeout) are rejected with an estimated Retry-After
+    instead of piling up behind the model.
+    """
+
+    def __init__(self, name, concurrency, per_user, queue_size, queue_timeout):
+        self.name = name
+        self.concurrency = concurrency
+        self.per_user = per_user
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._active = 0
+        self._active_by_user = {}
+        self._waiting = 0
+        self._service_time = 1.0   # EMA of seconds a slot is held, for Retry-After
+
+    def _can_run(self):
+        return self._active < self.concurrency
+
+    def _user_full(self, user):
+        return self.per_user > 0 and self._active_by_user.get(user, 0) >= self.per_user
+
+    def _retry_after(self):
+        # time for the queue ahead to drain through the available slots
+        backlog = self._waiting + 1
+        return max(1, int(math.ceil(self._service_time * backlog / max(1, self.concurrency))))
+
+    def _reject(self, reason):
+        # caller must hold self._cond
+        inc("echoverse_admission_rejected_total", controller=self.name, reason=reason)
+        if reason == "per_user_limit":
+            # the user's own request in flight has to finish first
+            return Overloaded(max(1, int(math.ceil(self._service_time))), reason)
+        return Overloaded(self._retry_after(), reason)
+
+    @property
+    def active(self):
+        return self._active
+
+    @property
+    def waiting(self):
+        return self._waiting
+
+    def overloaded(self, threshold=DEGRADED_QUEUE_THRESHOLD):
+        """True when requests are queueing beyond `threshold` (used to switch live sessions to degraded mode)."""
+        return self._waiting >= threshold
+
+    def check(self, user):
+        """Cheap early rejection: raise Overloaded if `user` could neither run nor queue right now."""
+        with self._cond:
+            if self._user_full(user):
+                raise self._reject("per_user_limit")
+            if not self._can_run() and self._waiting >= self.queue_size:
+                raise self._reject("queue_full")
+
+    def acquire(self, user, timeout=None):
+        """
+        Take a slot, waiting in the queue for at most `timeout` seconds (default queue_timeout;
+        0 = don't queue). Raises Overloaded when the user is at their limit or the wait fails.
+        """
+        start = time.perf_counter()
+        with self._cond:
+            if self._user_full(user):
+                raise self._reject("per_user_limit")
+            if not self._can_run():
+                if self._waiting >= self.queue_size:
+                    raise self._reject("queue_full")
+                self._waiting += 1
+                try:
+                    deadline = start + (self.queue_timeout if timeout is None else timeout)
+                    while not self._can_run():
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            raise self._reject("queue_timeout")
+                        self._cond.wait(remaining)
+                        if self._user_full(user):
+                            # another request of the same user took a slot while this one waited
+                            raise self._reject("per_user_limit")
+                finally:
+                    self._waiting -= 1
+            self._active += 1
+            self._active_by_user[user] = self._active_by_user.get(user, 0) + 1
+        observe("echoverse_admission_wait_seconds", time.perf_counter() - start, controller=self.name)
+        return time.perf_counter()
+
+    def release(self, user, acquired_at):
+        held = time.perf_counter() - acquired_at
+        with self._cond:
+            self._active -= 1
+            n = self._active_by_user.get(user, 1) - 1
+            if n <= 0:
+                self._active_by_user.pop(user, None)
+            else:
+                self._active_by_user[user] = n
+            self._service_time += 0.2 * (held - self._service_time)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, user, timeout=None):
+        acquired_at = self.acquire(user, timeout)
+        try:
+            yield
+        finally:
+            self.release(user, acquired_at)
+
+
+stt_admission = AdmissionController("stt", ADMISSION_STT_CONCURRENCY, ADMISSION_STT_PER_USER,
+                                    ADMISSION_STT_QUEUE, ADMISSION_QUEUE_TIMEOUT)
+# MT has no per-user limit: it only runs inside requests that already passed stt_admission.
+# Its queue wait is short (ADMISSION_MT_WAIT): callers return the text untranslated rather than
+# hold their request (and, on /api/process, an STT slot) behind a translation backlog
+mt_admission = AdmissionController("mt", ADMISSION_MT_CONCURRENCY, 0, ADMISSION_MT_QUEUE, ADMISSION_MT_WAIT)
+
+for _c in (stt_admission, mt_admission):
+    register_gauge(f"echoverse_admission_{_c.name}_active", lambda c=_c: c.active, f"Requests holding a {_c.name} slot")
+    register_gauge(f"echoverse_admission_{_c.name}_queue_depth", lambda c=_c: c.waiting, f"Requests waiting for a {_c.name} slot")
+
+
+def client_key():
+    """
+    Identify the caller without parsing the request body (that would defeat early rejection):
+    X-User-Id header, then bearer token, then user_id/session_id query args, then remote address.
+    """
+    user = request.headers.get("X-User-Id") or request.args.get("user_id")
+    if user:
+        return f"user:{user}"
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        return "token:" + hashlib.sha256(auth[7:].encode()).hexdigest()[:16]
+    session_id = request.args.get("session_id")
+    if session_id:
+        return f"session:{session_id}"
+    return f"addr:{request.remote_addr}"
+
+
+def overloaded_response(e):
+    resp = jsonify({"error": "overloaded", "reason": e.reason, "retry_after": e.retry_after})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+
+def _receive_body():
+    """
+    Pull the whole request body off the socket (multipart parts stream into their
+    UploadSinks), so a slow upload doesn't sit on a model slot.
+    """
+    if request.mimetype in ("multipart/form-data", "application/x-www-form-urlencoded"):
+        request.files
+    elif request.content_length is not None and request.content_length <= RAW_CHUNK_MAX_BYTES:
+        request.get_data()   # cached for the view; oversized raw bodies are rejected there unread
+
+
+def _check_and_receive(controller, user):
+    # a full queue (or a user at their limit) is rejected before the body is read
+    try:
+        controller.check(user)
+    except Overloaded as e:
+        return overloaded_response(e)
+    with timed("upload"):
+        _receive_body()
+    return None
+
+
+def receive(controller):
+    """
+    admit() without the slot: early 429 and body receipt only, for views that take
+    `controller.slot(client_key())` themselves around just the work that needs it.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            rejected = _check_and_receive(controller, client_key())
+            if rejected is not None:
+                return rejected
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def admit(controller):
+    """
+    Run the view inside one of `controller`'s slots, answering 429 + Retry-After when full.
+    A full queue is rejected before the body is read; the slot itself is only taken once
+    the upload has arrived, so it covers decode and inference, not the transfer.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            user = client_key()
+            rejected = _check_and_receive(controller, user)
+            if rejected is not None:
+                return rejected
+            try:
+                acquired_at = controller.acquire(user)
+            except Overloaded as e:
+                return overloaded_response(e)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                controller.release(user, acquired_at)
+        return wrapped
+    return decorator
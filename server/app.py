@@ -1,7 +1,7 @@
 # server/app.py
 from flask import Flask, request, jsonify, redirect
 from flask_cors import CORS
-from config import SECRET_KEY, BASE_URL, ACCESS_TOKEN_EXPIRES
+from config import SECRET_KEY, BASE_URL, ACCESS_TOKEN_EXPIRES, UPLOAD_MAX_BYTES, UPLOAD_MAX_FORM_MEMORY
 # models: import only what we use
 from models import (
     create_user,
@@ -14,6 +14,7 @@ from models import (
 )
 from oauth import create_code_doc, verify_pkce, issue_token
 from utils import require_bearer
+from admission import admit, stt_admission
 import secrets
 import json
 from chunk_stream import _flush_buffer, _BUFFERS_META, _BUFFERS, _LOCK, _transcribe_file
@@ -21,6 +22,11 @@ from chunk_stream import _flush_buffer, _BUFFERS_META, _BUFFERS, _LOCK, _transcr
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = SECRET_KEY
+# stream multipart uploads to per-upload scratch dirs (and into ffmpeg) as they arrive
+from uploads import StreamingRequest
+app.request_class = StreamingRequest
+app.config["MAX_CONTENT_LENGTH"] = UPLOAD_MAX_BYTES
+app.config["MAX_FORM_MEMORY_SIZE"] = UPLOAD_MAX_FORM_MEMORY
 CORS(app)
 
 
@@ -33,6 +39,22 @@ app.register_blueprint(process_bp, url_prefix="/api")
 from chunk_stream import chunk_bp
 app.register_blueprint(chunk_bp, url_prefix="/api")
 
+# Prometheus-style metrics: GET /metrics
+import metrics
+metrics.init_app(app)
+app.register_blueprint(metrics.metrics_bp)
+
+# Sampling profiler: POST /admin/profile?seconds=N, or X-Profile: 1 on any request
+import profiler
+profiler.init_app(app)
+app.register_blueprint(profiler.profiler_bp)
+
+# Liveness (/healthz) and readiness (/readyz); models load in the background so the
+# listener is up immediately and /readyz flips to 200 once Whisper is loaded
+import warmup
+app.register_blueprint(warmup.health_bp)
+warmup.start()
+
 
 # ---------------------
 # Register
@@ -176,16 +198,12 @@ def init_oauth_client():
 #     except Exception as e:
 #         print("Warning: init_oauth_client failed:", e)
 #     app.run(host="0.0.0.0", port=8000, debug=True)
-if __name__ == "__main__":
-    try:
-        # single-process dev server (no reloader) — stable on Windows
-        app.run(host="0.0.0.0", port=8000, debug=True, use_reloader=False)
-    except KeyboardInterrupt:
-        print("Server stopped by user")
-
 @app.route("/api/flush", methods=["POST"])
+@admit(stt_admission)
 def flush_manual():
-    from chunk_stream import _flush_buffer, _transcribe_file, _BUFFERS_META, _LOCK
+    from chunk_stream import _flush_buffer, _transcribe_file, _BUFFERS_META, _LOCK, _translation_context, _translate_new_segments, _segment_texts
+    from stt import whisper_loading, model_loading_response
+    from config import STT_ENGINE
     import os
 
     data = request.get_json() or {}
@@ -193,12 +211,21 @@ def flush_manual():
 
     if not session_id:
         return jsonify({"error": "missing_session_id"}), 400
+    if STT_ENGINE != "stub" and whisper_loading():
+        # keep the buffer; the client can retry the flush once the model is up
+        return model_loading_response()
 
-    file_path = _flush_buffer(session_id)
+    # grab session context before _flush_buffer drops the meta
+    ctx = _translation_context(session_id, data.get("tgt_lang"))
+    with _LOCK:
+        pinned = _BUFFERS_META.get(session_id, {}).get("language", {}).get("pinned")
+
+    # log-mel was computed as /api/chunk appended the audio; only the model runs here
+    file_path, log_mel = _flush_buffer(session_id)
     if not file_path:
         return jsonify({"status": "empty"})
 
-    result = _transcribe_file(file_path)
+    result = _transcribe_file(file_path, language=pinned, log_mel=log_mel)
     try:
         os.remove(file_path)
     except:
@@ -208,4 +235,17 @@ def flush_manual():
     with _LOCK:
         _BUFFERS_META.pop(session_id, None)
 
+    if "transcript" in result:
+        language = pinned or (result.get("raw") or {}).get("language")
+        mt = _translate_new_segments(ctx, _segment_texts(result), language)
+        if mt:
+            result.update(mt)
+
     return jsonify(result)
+
+if __name__ == "__main__":
+    try:
+        # single-process dev server (no reloader) — stable on Windows
+        app.run(host="0.0.0.0", port=8000, debug=True, use_reloader=False)
+    except KeyboardInterrupt:
+        print("Server stopped by user")
@@ -0,0 +1,303 @@
+# server/batch.py
+"""
+Offline batch transcription for archive backfills: the /api/process pipeline
+(decode -> Whisper -> Marian -> transcripts collection) run over a directory or
+manifest by a pool of worker processes, without going through HTTP.
+
+Results are appended to a JSONL file as they complete; re-running with the same
+--out skips files already recorded as "ok", so an interrupted run can be resumed.
+With the DB enabled, "ok" records that never reached Mongo (a --no-db run, or a failed
+write) are saved from the JSONL record instead of being transcribed again.
+Transcripts are upserted into Mongo in batches of --batch-size, keyed on the file path
+and target language, so a batch re-sent after a crash or partial failure is not duplicated.
+
+Examples:
+  python batch.py ./archive --out backfill.jsonl --tgt-lang hi --workers 4
+  python batch.py manifest.txt --out backfill.jsonl --no-db
+  python batch.py manifest.jsonl --out backfill.jsonl   # {"path": ..., "user_id": ..., "tgt_lang": ...} per line
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+SAMPLE_RATE = 16000
+AUDIO_EXTS = {".wav", ".mp3", ".m4a", ".flac", ".ogg", ".caf", ".aac", ".webm"}
+
+
+# ---------------------
+# Inputs
+# ---------------------
+def collect_jobs(inputs, defaults):
+    """Expand directories (recursively) and manifests (.txt: one path per line, .jsonl: one object per line)."""
+    jobs = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                for name in sorted(names):
+                    if os.path.splitext(name)[1].lower() in AUDIO_EXTS:
+                        jobs.append({**defaults, "path": os.path.join(root, name)})
+        elif item.endswith(".jsonl"):
+            base = os.path.dirname(os.path.abspath(item))
+            with open(item) as fh:
+                for line in fh:
+                    if line.strip():
+                        entry = json.loads(line)
+                        entry["path"] = os.path.join(base, entry["path"])
+                        jobs.append({**defaults, **entry})
+        elif item.endswith(".txt"):
+            base = os.path.dirname(os.path.abspath(item))
+            with open(item) as fh:
+                for line in fh:
+                    if line.strip() and not line.startswith("#"):
+                        jobs.append({**defaults, "path": os.path.join(base, line.strip())})
+        else:
+            jobs.append({**defaults, "path": item})
+    unique = {}
+    for job in jobs:
+        job["path"] = os.path.abspath(job["path"])
+        unique.setdefault(job_key(job), job)   # a file listed twice is processed once
+    return list(unique.values())
+
+
+def job_key(job):
+    return f"{job['path']}|{job.get('tgt_lang')}"
+
+
+def load_done(out_path):
+    """
+    Jobs already transcribed in a previous run of the same output file: key -> its "ok"
+    record, preferring one whose transcript was saved to the DB ("saved": true).
+    """
+    done = {}
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path) as fh:
+        for line in fh:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue   # a line cut short by an interrupted run
+            if record.get("status") == "ok" and (record["key"] not in done or record.get("saved")):
+                done[record["key"]] = record
+    return done
+
+
+# ---------------------
+# Worker process
+# ---------------------
+def _init_worker(torch_threads):
+    # one Whisper (and Marian cache) per worker; keep torch from oversubscribing the cores
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    import stt
+    stt.load_whisper()
+
+
+def _load_pcm(path):
+    """16 kHz mono s16 PCM: WAV in-process, everything else through ffmpeg."""
+    from uploads import is_wav_header, parse_wav_bytes, to_pipeline_pcm, decode_file_to_wav, read_wav_pcm
+    with open(path, "rb") as fh:
+        head = fh.read(12)
+    if is_wav_header(head):
+        with open(path, "rb") as fh:
+            data = fh.read()
+        try:
+            pcm, rate, channels = parse_wav_bytes(data)
+            return to_pipeline_pcm(pcm, rate, channels)
+        except ValueError:
+            pass
+    scratch = tempfile.mkdtemp(prefix="echoverse-batch-")
+    try:
+        return read_wav_pcm(decode_file_to_wav(path, os.path.join(scratch, "decoded.wav")))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def process_file(job):
+    """Transcribe + translate one file. Runs in a worker; returns a JSON-serializable record (no DB access)."""
+    import stt
+    from uploads import pcm_to_audio
+    from translate import translate_text
+
+    record = {"key": job_key(job), "path": job["path"], "tgt_lang": job.get("tgt_lang"),
+              "user_id": job.get("user_id"), "timings": {}}
+    whisper_model = stt.get_whisper_model()
+    if whisper_model is None:
+        return {**record, "status": "error", "error": "whisper_unavailable"}
+    try:
+        start = time.perf_counter()
+        pcm = _load_pcm(job["path"])
+        record["audio_seconds"] = len(pcm) / float(SAMPLE_RATE * 2)
+        record["timings"]["decode"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = whisper_model.transcribe(pcm_to_audio(pcm), fp16=False, language=job.get("language"))
+        record["timings"]["whisper"] = time.perf_counter() - start
+        record["transcript"] = result.get("text", "").strip()
+        record["language"] = result.get("language") or job.get("language")
+
+        mt = {"translation": None, "used_model": None, "method": "none"}
+        if job.get("tgt_lang") and record["transcript"]:
+            start = time.perf_counter()
+            mt = translate_text(record["transcript"], record["language"] or "en", job["tgt_lang"])
+            record["timings"]["translate"] = time.perf_counter() - start
+        record["translation"] = mt["translation"]
+        record["mt_meta"] = {"method": mt["method"], "used_model": mt.get("used_model")}
+        record["status"] = "ok"
+    except Exception as e:
+        record.update(status="error", error=str(e))
+    return record
+
+
+def transcript_doc(record):
+    # same shape as /api/process writes via models.save_transcript
+    return {
+        "user_id": record.get("user_id"),
+        "src_text": record["transcript"],
+        "tgt_text": record.get("translation"),
+        "src_lang": record.get("language"),
+        "tgt_lang": record.get("tgt_lang"),
+        "meta": {**record.get("mt_meta", {}), "source": "batch", "path": record["path"]},
+    }
+
+
+# ---------------------
+# Driver
+# ---------------------
+class Writer:
+    """Appends records to the JSONL output, upserting transcripts into Mongo in batches first."""
+
+    def __init__(self, out_path, batch_size, save_db):
+        self.fh = open(out_path, "a")
+        self.batch_size = batch_size
+        self.save_db = save_db
+        self.pending = []
+        self.saved = 0
+        self.db_failed = 0
+
+    def add(self, record):
+        if self.save_db and record["status"] == "ok":
+            self.pending.append(record)
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+        else:
+            self._write([record])
+
+    def flush(self):
+        if not self.pending:
+            return
+        records, self.pending = self.pending, []
+        try:
+            from models import save_transcripts
+            saved, failed = save_transcripts([transcript_doc(r) for r in records])
+        except Exception as e:
+            saved, failed = 0, {i: str(e) for i in range(len(records))}
+        self.saved += saved
+        for i, r in enumerate(records):
+            if i in failed:
+                # recorded as not done, so a resumed run processes (and upserts) them again
+                print("transcript upsert failed:", r["path"], failed[i], file=sys.stderr)
+                self.db_failed += 1
+                r.update(status="db_failed", error=failed[i])
+            else:
+                r["saved"] = True
+        # only written once their transcripts are in the DB: a crash before this point redoes
+        # them, and the upsert keeps the second write from adding another row
+        self._write(records)
+
+    def _write(self, records):
+        for r in records:
+            self.fh.write(json.dumps(r, ensure_ascii=False) + "\n")
+        self.fh.flush()
+
+    def close(self):
+        self.flush()
+        self.fh.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Batch transcription (and translation) of audio archives")
+    ap.add_argument("inputs", nargs="+", help="audio files, directories, or manifests (.txt / .jsonl)")
+    ap.add_argument("--out", required=True, help="JSONL results file (appended to; completed entries are skipped)")
+    ap.add_argument("--tgt-lang", help="translate transcripts to this language")
+    ap.add_argument("--language", help="source language, skips Whisper's language detection")
+    ap.add_argument("--user-id", help="user_id stored with each transcript")
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    ap.add_argument("--torch-threads", type=int, default=0, help="torch threads per worker (default: cores / workers)")
+    ap.add_argument("--model", help="Whisper model for this run (overrides WHISPER_MODEL)")
+    ap.add_argument("--batch-size", type=int, default=50, help="transcripts per bulk write")
+    ap.add_argument("--no-db", action="store_true", help="only write the JSONL output")
+    args = ap.parse_args(argv)
+
+    if args.model:
+        # read by config.py in each (spawned) worker
+        os.environ["WHISPER_MODEL"] = args.model
+
+    defaults = {"tgt_lang": args.tgt_lang, "language": args.language, "user_id": args.user_id}
+    jobs = collect_jobs(args.inputs, defaults)
+    done = load_done(args.out)
+    todo = [job for job in jobs if job_key(job) not in done]
+    # transcribed earlier but never written to the DB (e.g. a --no-db run): only the write is left
+    unsaved = [] if args.no_db else [done[job_key(job)] for job in jobs
+                                     if job_key(job) in done and not done[job_key(job)].get("saved")]
+    print(f"{len(jobs)} files, {len(jobs) - len(todo)} already done ({len(unsaved)} still to save), "
+          f"{len(todo)} to process", file=sys.stderr)
+
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+    writer = Writer(args.out, args.batch_size, not args.no_db)
+    for record in unsaved:
+        writer.add(record)
+    counts = {"ok": 0, "error": 0}
+    audio_seconds = 0.0
+    stage_seconds = {}
+    start = time.time()
+    # spawn, not fork: each worker initializes its own torch runtime
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(torch_threads,)) as pool:
+            futures = [pool.submit(process_file, job) for job in todo]
+            for n, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+                if record["status"] == "ok":
+                    audio_seconds += record.get("audio_seconds", 0.0)
+                    for stage, seconds in record["timings"].items():
+                        stage_seconds[stage] = stage_seconds.get(stage, 0.0) + seconds
+                else:
+                    print(f"[{n}/{len(todo)}] {record['path']}: {record.get('error')}", file=sys.stderr)
+                writer.add(record)
+    finally:
+        writer.close()
+    wall = time.time() - start
+
+    report = {
+        "files": len(jobs),
+        "skipped_done": len(jobs) - len(todo),
+        "processed": len(todo),
+        "ok": counts.get("ok", 0),
+        "errors": counts.get("error", 0),
+        "saved": writer.saved,
+        "db_failed": writer.db_failed,
+        "workers": args.workers,
+        "audio_s": round(audio_seconds, 3),
+        "wall_s": round(wall, 3),
+        # > 1.0 means the archive is processed faster than real time
+        "audio_s_per_wall_s": round(audio_seconds / wall, 3) if wall > 0 else None,
+        "stage_seconds_total": {stage: round(seconds, 3) for stage, seconds in stage_seconds.items()},
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if counts.get("error", 0) == 0 and writer.db_failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,330 @@
+# server/bench.py
+"""
+Component micro-benchmarks with regression thresholds.
+
+  python bench.py                       # run, compare against bench_baseline.json
+  python bench.py --save-baseline       # run and store the result as the new baseline
+  python bench.py --only rms,serialize  # run a subset (substring match on name)
+  python bench.py --out results.json --threshold 0.25
+
+Exit code is 1 when any benchmark errors, is slower than baseline * (1 + threshold),
+or is in the baseline but produced no timing this run; and 2 when there is no
+baseline to compare against (baselines are per machine, so create one with
+--save-baseline on the machine that runs the gate).
+Benchmarks whose optional dependency is missing (ffmpeg binary, mongomock, Marian
+weights) are reported as "skipped"; on a machine whose baseline has them, that fails.
+"""
+import io
+import os
+import sys
+import json
+import time
+import wave
+import shutil
+import struct
+import random
+import argparse
+import platform
+import statistics
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "bench_baseline.json")
+
+# Per-benchmark overrides of the regression threshold (noisy / IO-bound paths get more slack)
+THRESHOLDS = {
+    "ffmpeg_to_wav_bytes": 0.5,
+    "translate_text_direct": 0.35,
+    "translate_text_pivot": 0.35,
+}
+
+
+class Skip(Exception):
+    pass
+
+
+def _pcm(seconds, seed=0):
+    rng = random.Random(seed)
+    n = int(16000 * seconds)
+    return struct.pack(f"<{n}h", *(rng.randint(-3000, 3000) for _ in range(n)))
+
+
+def _wav_file(seconds, seed=0):
+    import tempfile
+    tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
+    tmp.close()
+    with wave.open(tmp.name, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(16000)
+        wf.writeframes(_pcm(seconds, seed))
+    return tmp.name
+
+
+# ---------------------
+# Benchmarks: each returns a zero-arg callable (one operation) and an optional cleanup
+# ---------------------
+def bench_rms_from_frame():
+    from chunk_stream import rms_from_frame
+    frame = _pcm(0.03)
+    return lambda: rms_from_frame(frame), None
+
+
+def bench_frames_from_pcm():
+    from chunk_stream import frames_from_pcm, rms_from_frame
+    pcm = _pcm(1.5)
+    return lambda: [rms_from_frame(f) for f in frames_from_pcm(pcm)], None
+
+
+def bench_ffmpeg_to_wav_bytes():
+    if shutil.which("ffmpeg") is None:
+        raise Skip("ffmpeg not on PATH")
+    from chunk_stream import ffmpeg_to_wav_bytes
+    src = _wav_file(1.5)
+
+    def op():
+        os.remove(ffmpeg_to_wav_bytes(src))
+    return op, lambda: os.remove(src)
+
+
+def bench_wav_fast_path():
+    # same 1.5 s chunk as the ffmpeg benchmark, but 48 kHz stereo parsed/resampled in-process
+    from uploads import parse_wav_bytes, to_pipeline_pcm
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(2)
+        wf.setsampwidth(2)
+        wf.setframerate(48000)
+        wf.writeframes(_pcm(1.5 * 6))
+    data = buf.getvalue()
+
+    def op():
+        pcm, rate, channels = parse_wav_bytes(data)
+        to_pipeline_pcm(pcm, rate, channels)
+    return op, None
+
+
+def bench_flush_buffer():
+    from chunk_stream import _append_to_buffer, _flush_buffer
+    pcm = _pcm(1.5)
+
+    def op():
+        for _ in range(4):
+            _append_to_buffer("bench", pcm)
+        os.remove(_flush_buffer("bench")[0])
+    return op, None
+
+
+def bench_mel_incremental():
+    # per-chunk feature cost moved off the flush path: one 1.5 s append + the final frames
+    from mel import IncrementalLogMel, mel_filters
+    try:
+        mel_filters(80)
+    except ImportError:
+        raise Skip("whisper not installed (mel filterbank)")
+    pcm = _pcm(1.5)
+
+    def op():
+        features = IncrementalLogMel(80)
+        features.append(pcm)
+        features.finalize()
+    return op, None
+
+
+def _marian(src, tgt):
+    try:
+        from translate import get_marian_model
+        pair = get_marian_model(src, tgt)
+    except Exception as e:
+        raise Skip(f"translation models unavailable: {e}")
+    if not pair:
+        raise Skip(f"no Marian model for {src}-{tgt}")
+    return pair
+
+
+def bench_translate_text_direct():
+    from translate import translate_text
+    _marian("en", "hi")
+    return lambda: translate_text("How are you doing today?", "en", "hi"), None
+
+
+def bench_translate_text_pivot():
+    from translate import translate_text, MARIAN_MAP
+    # find a src->en->tgt route without a direct model
+    for src, targets in MARIAN_MAP.items():
+        if src == "en" or "en" not in targets:
+            continue
+        for tgt in MARIAN_MAP.get("en", {}):
+            if tgt != src and tgt not in targets:
+                _marian(src, "en")
+                _marian("en", tgt)
+                return lambda: translate_text("aap kaise hain", src, tgt), None
+    raise Skip("no pivot route in MARIAN_MAP")
+
+
+def _mongo_standin():
+    try:
+        import mongomock
+    except ImportError:
+        raise Skip("mongomock not installed")
+    import models
+    db = mongomock.MongoClient()["bench"]
+    for name in ("users", "oauth_clients", "oauth_codes", "oauth_tokens", "transcripts"):
+        setattr(models, name, db[name])
+    return models
+
+
+def bench_serialize_doc():
+    from bson.objectid import ObjectId
+    from models import serialize_doc
+    doc = {
+        "_id": ObjectId(), "client_id": "echoverse-mobile-client",
+        "redirect_uris": ["echoverse://oauth", "http://localhost:19006/--/*"],
+        "meta": {"owner": ObjectId(), "tags": [{"_id": ObjectId(), "k": "v"}] * 4},
+    }
+    return lambda: serialize_doc(doc), None
+
+
+def bench_models_get_token():
+    models = _mongo_standin()
+    models.save_token({"access_token": "bench-token", "user_id": "u1", "scope": ""})
+    return lambda: models.get_token("bench-token"), None
+
+
+def bench_models_save_transcript():
+    models = _mongo_standin()
+    doc = {"user_id": "u1", "src_text": "hello", "tgt_text": "namaste", "src_lang": "en", "tgt_lang": "hi", "meta": {}}
+    return lambda: models.save_transcript(dict(doc)), None
+
+
+BENCHMARKS = [
+    ("rms_from_frame", bench_rms_from_frame),
+    ("frames_from_pcm", bench_frames_from_pcm),
+    ("ffmpeg_to_wav_bytes", bench_ffmpeg_to_wav_bytes),
+    ("wav_fast_path", bench_wav_fast_path),
+    ("flush_buffer", bench_flush_buffer),
+    ("mel_incremental", bench_mel_incremental),
+    ("translate_text_direct", bench_translate_text_direct),
+    ("translate_text_pivot", bench_translate_text_pivot),
+    ("serialize_doc", bench_serialize_doc),
+    ("models_get_token", bench_models_get_token),
+    ("models_save_transcript", bench_models_save_transcript),
+]
+
+
+def measure(op, min_time=0.2, repeats=5):
+    """Median seconds per operation over `repeats` rounds, each round running >= min_time."""
+    op()  # warm-up (model caches, imports)
+    # calibrate iterations per round
+    n = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            op()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time or n >= 1 << 20:
+            break
+        n *= 2
+    rounds = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            op()
+        rounds.append((time.perf_counter() - t0) / n)
+    return {"median_s": statistics.median(rounds), "min_s": min(rounds), "iterations": n, "repeats": repeats}
+
+
+def compare(results, baseline, default_threshold):
+    """Returns (regressions, missing): slower than allowed, and baselined but without a timing now."""
+    regressions = []
+    missing = []
+    for name, r in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "median_s" not in base:
+            continue
+        if "median_s" not in r:
+            missing.append((name, r.get("skipped") or r.get("error")))
+            continue
+        ratio = r["median_s"] / base["median_s"]
+        limit = THRESHOLDS.get(name, default_threshold)
+        r["baseline_s"] = base["median_s"]
+        r["ratio"] = round(ratio, 3)
+        r["regressed"] = ratio > 1 + limit
+        if r["regressed"]:
+            regressions.append((name, ratio, limit))
+    return regressions, missing
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="EchoVerse component micro-benchmarks")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown vs baseline (0.2 = 20%%)")
+    ap.add_argument("--only", help="comma-separated substrings of benchmark names")
+    ap.add_argument("--min-time", type=float, default=0.2)
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--out", help="write machine-readable results here")
+    args = ap.parse_args(argv)
+
+    # keep benchmarks hermetic: no whisper load, no metrics bookkeeping noise
+    os.environ.setdefault("METRICS_ENABLED", "0")
+    sys.path.insert(0, HERE)
+
+    wanted = [s.strip() for s in args.only.split(",")] if args.only else None
+    results = {}
+    for name, factory in BENCHMARKS:
+        if wanted and not any(w in name for w in wanted):
+            continue
+        cleanup = None
+        try:
+            op, cleanup = factory()
+            results[name] = measure(op, args.min_time, args.repeats)
+            print(f"{name:28s} {results[name]['median_s'] * 1e6:12.1f} us/op")
+        except Skip as e:
+            results[name] = {"skipped": str(e)}
+            print(f"{name:28s} {'skipped':>12s}  ({e})")
+        except Exception as e:
+            # a broken import or a crash in the code under test is a failure, not a skip
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+            print(f"{name:28s} {'ERROR':>12s}  ({type(e).__name__}: {e})")
+        finally:
+            if cleanup:
+                cleanup()
+
+    report = {
+        "created_at": int(time.time()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+    regressions = []
+    missing = []
+    missing_baseline = False
+    if args.save_baseline:
+        with open(args.baseline, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as fh:
+            regressions, missing = compare(results, json.load(fh), args.threshold)
+    else:
+        # a gate that can't compare must not pass silently
+        print(f"no baseline at {args.baseline}; run with --save-baseline to create one", file=sys.stderr)
+        missing_baseline = True
+
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    errors = [name for name, r in results.items() if "error" in r]
+    for name, ratio, limit in regressions:
+        print(f"REGRESSION {name}: {ratio:.2f}x baseline (limit {1 + limit:.2f}x)")
+    for name, reason in missing:
+        print(f"MISSING {name}: in the baseline but not measured ({reason})")
+    if regressions or missing or errors:
+        return 1
+    return 2 if missing_baseline else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,22 @@
 # server/chunk_stream.py
-import os
-import io
 import time
 import tempfile
 import threading
-import subprocess
 import wave
 import math
-from flask import Blueprint, request, jsonify
-from werkzeug.utils import secure_filename
-from stt import WHISPER_AVAILABLE, whisper_model
+import sys
+from array import array
+from collections import OrderedDict
+from functools import wraps
+from flask import Blueprint, request, jsonify, make_response
+from stt import WHISPER_MODEL_NAME, get_whisper_model, get_degraded_model, whisper_loading, model_loading_response
+from metrics import timed, inc, register_gauge
+from config import STT_ENGINE, STT_STUB_LATENCY_MS
+from translate import translate_text
+from uploads import streaming_decode, get_upload, pcm_to_audio, decode_file_to_wav, is_wav_header, is_container_header, parse_wav_bytes, to_pipeline_pcm, decode_bytes
+from transcript_cache import transcript_cache, audio_key
+from admission import receive, stt_admission, mt_admission, client_key, Overloaded, overloaded_response
+from config import DEGRADED_WHISPER_MODEL, RAW_CHUNK_MAX_BYTES
 
 # Blueprint
 chunk_bp = Blueprint("chunk", __name__)
@@ -17,7 +24,10 @@ chunk_bp = Blueprint("chunk", __name__)
 # Globals: buffers per session
 _BUFFERS = {}         # session_id -> bytearray (raw PCM 16-bit LE)
 _BUFFERS_META = {}    # session_id -> { "last_active": ts, "speech_active": bool, "silence_frames": int, "calibration": {...} }
+_FEATURES = {}        # session_id -> mel.IncrementalLogMel kept in step with _BUFFERS (None when there is no Whisper to feed)
 _LOCK = threading.Lock()
+_SEQUENCES = {}       # session_id -> chunk sequencing state; outlives buffer flushes
+_SEQ_COND = threading.Condition(_LOCK)   # guards _SEQUENCES, under the same lock as the buffers
 
 # VAD params (energy-based)
 FRAME_MS = 30             # frame size in ms
@@ -29,41 +39,53 @@ MIN_SILENCE_THRESHOLD = 1.0    # global minimum threshold (very small)
 DEFAULT_SILENCE_MS_THRESHOLD = 300    # ms of silence to finalize
 SILENCE_FRAMES_THRESHOLD = max(1, int(DEFAULT_SILENCE_MS_THRESHOLD / FRAME_MS))
 
+# Silence gating for the live path: a chunk is speech only if enough frames rise
+# clearly above the session's noise floor (floor * ratio + margin)
+CALIBRATION_CHUNKS = 3          # chunks observed before the session floor is trusted
+NOISE_FLOOR_PERCENTILE = 0.1    # per-chunk floor estimate = 10th percentile frame RMS
+SPEECH_FLOOR_RATIO = 2.0        # ~6 dB above the floor
+MIN_SPEECH_FRAMES = 3           # ~90 ms of energetic frames needed to call it speech
+FLOOR_ADAPT_RATE = 0.1          # EMA rate for tracking the floor on silent chunks
+DIGITAL_SILENCE_FLOOR = 1.0     # chunk floor below 1 LSB = muted/warming-up mic, not room noise
+
+# Per-session language pinning: learn the language from confident detections, then
+# pass it to Whisper so it skips its own detection pass on every chunk
+LANG_PIN_CONFIDENCE = 0.8       # detection probability that counts as a confident vote
+LANG_PIN_VOTES = 2              # agreeing confident votes needed to pin
+LANG_REDETECT_LOGPROB = -1.0    # mean segment avg_logprob below this = low confidence
+LANG_REDETECT_STREAK = 2        # consecutive low-confidence chunks before unpinning
+
+# Incremental live translation: finalized segments already translated in this session
+# are served from the per-session context instead of being translated again
+TRANSLATION_CONTEXT_MAX = 64    # (src_lang, text) -> translation entries kept per session
+
+# Sequence-numbered chunks (?seq=0,1,2,... per session): repeats are answered from the
+# session's recent results before any decode, and a chunk that overtakes an earlier one
+# waits briefly for it to arrive
+CHUNK_REORDER_WAIT = 1.0        # seconds a chunk waits for missing predecessors
+CHUNK_RESULTS_MAX = 32          # seq -> response kept per session for retries
+
+# Decoding precomputed log-mel at finalize (same fallback rules as whisper.transcribe)
+DECODE_TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
 # Fallback (force finalize) config
 FALLBACK_MAX_BUFFER_SECONDS = 6  # if buffer exceeds this, force finalize
+# Transcribed live speech is also kept per session for /api/flush to re-transcribe with full
+# context; past this the buffer restarts from the newest chunk (one Whisper window)
+LIVE_BUFFER_MAX_SECONDS = 30
 
-ALLOWED_EXTS = {".wav", ".mp3", ".m4a", ".ogg", ".flac", ".aac", ".caf", ".webm"}
+# Raw (non-multipart) chunk bodies: interleaved s16le PCM, or a WAV file
+RAW_PCM_MIMETYPES = {"application/octet-stream", "audio/l16", "audio/pcm", "audio/wav", "audio/x-wav", "audio/wave"}
+RAW_MAX_CHANNELS = 8
+RAW_MIN_RATE, RAW_MAX_RATE = 8000, 192000
 
 def ffmpeg_to_wav_bytes(src_path, target_rate=SAMPLE_RATE):
     tmp_wav = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-    tmp_wav_path = tmp_wav.name
     tmp_wav.close()
-    cmd = [
-        "ffmpeg", "-y", "-i", src_path,
-        "-ar", str(target_rate),
-        "-ac", "1",
-        "-sample_fmt", "s16",
-        tmp_wav_path
-    ]
-    try:
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"ffmpeg failed: {e.stderr.decode('utf-8', errors='ignore')}")
-    return tmp_wav_path
-
-def wav_to_pcm_bytes(wav_path):
-    with wave.open(wav_path, 'rb') as wf:
-        sampwidth = wf.getsampwidth()
-        channels = wf.getnchannels()
-        fr = wf.getframerate()
-        if sampwidth != 2:
-            raise RuntimeError(f"Unexpected sample width: {sampwidth}")
-        if channels != 1:
-            raise RuntimeError(f"Expected mono WAV but got {channels} channels")
-        if fr != SAMPLE_RATE:
-            raise RuntimeError(f"Expected {SAMPLE_RATE}Hz but got {fr}Hz")
-        frames = wf.readframes(wf.getnframes())
-    return frames
+    return decode_file_to_wav(src_path, tmp_wav.name, target_rate)
 
 def frames_from_pcm(raw_pcm_bytes, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS):
     bytes_per_frame = int(sample_rate * (frame_ms / 1000.0) * BYTES_PER_SAMPLE)
@@ -72,43 +94,173 @@ def frames_from_pcm(raw_pcm_bytes, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS):
 
 def rms_from_frame(frame_bytes):
     # frame_bytes is bytes of 16-bit PCM little-endian samples
-    if not frame_bytes:
-        return 0.0
     count = len(frame_bytes) // 2
     if count == 0:
         return 0.0
-    total_squares = 0
-    for i in range(0, len(frame_bytes), 2):
-        sample = int.from_bytes(frame_bytes[i:i+2], byteorder='little', signed=True)
-        total_squares += sample * sample
+    samples = array('h', frame_bytes[:count * 2])
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    total_squares = sum(x * x for x in samples)
     mean_squares = total_squares / count
     rms = math.sqrt(mean_squares)
     return rms
 
+def _new_meta():
+    return {
+        "last_active": time.time(),
+        "speech_active": False,
+        "silence_frames": 0,
+        # calibration structure
+        "calibration": {
+            "samples": [],   # per-chunk noise floor estimates until calibrated
+            "calibrated": False,
+            "noise_floor": None,
+            "session_threshold": None
+        },
+        # language pinning state
+        "language": {
+            "pinned": None,    # language code passed to Whisper, or None for auto
+            "source": "auto",  # "auto" | "detected" | "client"
+            "votes": {},       # lang -> confident detections while unpinned
+            "low_conf_streak": 0
+        },
+        # incremental translation context
+        "translation": {
+            "tgt_lang": None,
+            "done": OrderedDict(),   # (src_lang, segment_text) -> translation
+            "segments_translated": 0
+        }
+    }
+
+def _get_meta(session_id):
+    # caller must hold _LOCK
+    meta = _BUFFERS_META.get(session_id)
+    if meta is None:
+        meta = _new_meta()
+        _BUFFERS_META[session_id] = meta
+    return meta
+
+def _get_sequence(session_id):
+    # caller must hold _LOCK; kept apart from _BUFFERS_META so flushing the buffer
+    # doesn't reset it (a retried old seq would otherwise be transcribed again)
+    state = _SEQUENCES.get(session_id)
+    if state is None:
+        state = {
+            "next": 0,                  # lowest seq that has not arrived yet
+            "seen": set(),              # arrived seqs above "next"
+            "missing": set(),           # seqs given up on (or failed) that may still be processed late
+            "in_flight": set(),         # seqs being processed or waiting for a predecessor
+            "results": OrderedDict(),   # seq -> response body of a successful chunk
+            "last_active": time.time()
+        }
+        _SEQUENCES[session_id] = state
+    return state
+
+def _new_features():
+    """Incremental log-mel state for a new session buffer, or None when Whisper isn't loaded."""
+    whisper_model = get_whisper_model()
+    if STT_ENGINE == "stub" or whisper_model is None:
+        return None
+    try:
+        from mel import IncrementalLogMel
+        return IncrementalLogMel(whisper_model.dims.n_mels)
+    except Exception as e:
+        print("log-mel features unavailable:", e)
+        return None
+
+def _append_pcm(session_id, pcm_bytes):
+    with _LOCK:
+        meta = _get_meta(session_id)
+        _BUFFERS.setdefault(session_id, bytearray()).extend(pcm_bytes)
+        meta["last_active"] = time.time()
+
 def _append_to_buffer(session_id, pcm_bytes):
+    max_bytes = LIVE_BUFFER_MAX_SECONDS * SAMPLE_RATE * BYTES_PER_SAMPLE
     with _LOCK:
-        if session_id not in _BUFFERS:
+        if session_id not in _BUFFERS or len(_BUFFERS[session_id]) + len(pcm_bytes) > max_bytes:
             _BUFFERS[session_id] = bytearray()
-            _BUFFERS_META[session_id] = {
-                "last_active": time.time(),
-                "speech_active": False,
-                "silence_frames": 0,
-                # calibration structure
-                "calibration": {
-                    "samples": [],   # list of rms_avg values until calibrated
-                    "calibrated": False,
-                    "session_threshold": None
-                }
-            }
-        _BUFFERS[session_id].extend(pcm_bytes)
-        _BUFFERS_META[session_id]["last_active"] = time.time()
+            _FEATURES[session_id] = _new_features()
+        features = _FEATURES.get(session_id)
+    if features is None:
+        _append_pcm(session_id, pcm_bytes)
+        return
+    # log-mel frames are computed as audio arrives so _flush_buffer only has to run the model;
+    # holding the features lock keeps PCM and frames appended in the same order
+    with features.lock:
+        _append_pcm(session_id, pcm_bytes)
+        with timed("mel_incremental"):
+            features.append(pcm_bytes)
+
+def _detect_speech(session_id, pcm_bytes):
+    """
+    Energy VAD gate for one chunk against the session's calibrated noise floor.
+    Returns (speech_detected, stats). Updates calibration / speech_active / silence_frames.
+    """
+    rms_values = [rms_from_frame(f) for f in frames_from_pcm(pcm_bytes) if len(f) >= 4]
+    if not rms_values:
+        return False, {"frames": 0}
+    ordered = sorted(rms_values)
+    chunk_floor = ordered[int((len(ordered) - 1) * NOISE_FLOOR_PERCENTILE)]
+
+    with _LOCK:
+        meta = _get_meta(session_id)
+        meta["last_active"] = time.time()
+        calib = meta["calibration"]
+        # digital silence says nothing about the room: it must not pull the floor to 0,
+        # which would disable the gate for the rest of the session
+        digital_silence = chunk_floor < DIGITAL_SILENCE_FLOOR
+        if not calib["calibrated"]:
+            if not digital_silence:
+                calib["samples"].append(chunk_floor)
+            # the quietest chunk seen so far is the best floor estimate (speechy chunks overestimate it)
+            floor = min(calib["samples"]) if calib["samples"] else DIGITAL_SILENCE_FLOOR
+            if len(calib["samples"]) >= CALIBRATION_CHUNKS:
+                calib["calibrated"] = True
+        else:
+            floor = calib["noise_floor"]
+        threshold = max(MIN_SILENCE_THRESHOLD, floor * SPEECH_FLOOR_RATIO + MIN_SILENCE_THRESHOLD)
+        speech_frames = sum(1 for r in rms_values if r > threshold)
+        speech_detected = speech_frames >= min(MIN_SPEECH_FRAMES, len(rms_values))
+
+        # track slow drift in background noise; let the floor drop immediately
+        if chunk_floor < floor and not digital_silence:
+            floor = chunk_floor
+        elif calib["calibrated"] and not speech_detected:
+            floor += FLOOR_ADAPT_RATE * (chunk_floor - floor)
+        calib["noise_floor"] = floor
+        calib["session_threshold"] = threshold
+
+        if speech_detected:
+            meta["speech_active"] = True
+            meta["silence_frames"] = 0
+        else:
+            meta["silence_frames"] = meta.get("silence_frames", 0) + len(rms_values)
+
+    return speech_detected, {
+        "frames": len(rms_values),
+        "speech_frames": speech_frames,
+        "noise_floor": round(floor, 2),
+        "threshold": round(threshold, 2),
+    }
 
 def _flush_buffer(session_id):
+    """
+    Pop a session's buffered audio. Returns (wav_path, log_mel) where log_mel is the
+    precomputed encoder input (or None without Whisper), or (None, None) when empty.
+    """
     with _LOCK:
         buf = _BUFFERS.pop(session_id, None)
         meta = _BUFFERS_META.pop(session_id, None)
+        features = _FEATURES.pop(session_id, None)
     if not buf:
-        return None
+        return None, None
+    log_mel = None
+    if features is not None:
+        try:
+            with features.lock, timed("mel_finalize"):
+                log_mel = features.finalize()
+        except Exception as e:
+            print("log-mel finalize failed:", e)
     tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
     tmp_path = tmp.name
     tmp.close()
@@ -117,17 +269,328 @@ def _flush_buffer(session_id):
         wf.setsampwidth(BYTES_PER_SAMPLE)
         wf.setframerate(SAMPLE_RATE)
         wf.writeframes(bytes(buf))
-    return tmp_path
+    return tmp_path, log_mel
 
-def _transcribe_file(path):
-    if not WHISPER_AVAILABLE or whisper_model is None:
-        return {"error": "whisper_unavailable"}
+def _stub_transcribe(source):
+    # Fake engine for load tests: fixed latency, deterministic text derived from audio length
+    time.sleep(STT_STUB_LATENCY_MS / 1000.0)
+    if isinstance(source, (bytes, bytearray)):
+        seconds = len(source) / float(SAMPLE_RATE * BYTES_PER_SAMPLE)
+    else:
+        with wave.open(source, 'rb') as wf:
+            seconds = wf.getnframes() / float(wf.getframerate() or SAMPLE_RATE)
+    text = f"stub transcript {seconds:.2f}s"
+    return {"transcript": text, "raw": {"text": text, "language": "en", "segments": []}}
+
+def _decode_with_fallback(model, segment, language):
+    import whisper
+    for temperature in DECODE_TEMPERATURES:
+        options = whisper.DecodingOptions(language=language, temperature=temperature, fp16=False, without_timestamps=True)
+        result = whisper.decode(model, segment, options)
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD:
+            break   # silence: a hotter temperature won't help
+        if result.compression_ratio <= COMPRESSION_RATIO_THRESHOLD and result.avg_logprob >= LOGPROB_THRESHOLD:
+            break
+    return result
+
+def _transcribe_mel(log_mel, language=None, model=None):
+    """
+    Transcribe precomputed log-mel (mel.IncrementalLogMel.finalize()) window by window,
+    so finalization skips Whisper's own feature pass. Output mirrors model.transcribe().
+    """
+    import torch
+    import torch.nn.functional as F
+    from mel import N_FRAMES, FRAMES_PER_SECOND, silence_value
+    mel = torch.from_numpy(log_mel).to(model.device)
+    total = mel.shape[-1]
+    # transcribe() slices windows out of audio padded with 30 s of zeros, so a short last
+    # window ends in log-mel silence, not in 0 (which is a loud, flat spectrum after scaling)
+    pad = silence_value(log_mel)
+    segments = []
+    for seek in range(0, total, N_FRAMES):
+        segment = mel[:, seek:seek + N_FRAMES]
+        segment = F.pad(segment, (0, N_FRAMES - segment.shape[-1]), value=pad)
+        result = _decode_with_fallback(model, segment, language)
+        # like transcribe(): the language found in the first window is used for the rest
+        language = language or result.language
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+            continue
+        segments.append({
+            "id": len(segments),
+            "start": seek / FRAMES_PER_SECOND,
+            "end": min(seek + N_FRAMES, total) / FRAMES_PER_SECOND,
+            "text": result.text,
+            "temperature": result.temperature,
+            "avg_logprob": result.avg_logprob,
+            "compression_ratio": result.compression_ratio,
+            "no_speech_prob": result.no_speech_prob,
+        })
+    text = " ".join(seg["text"].strip() for seg in segments)
+    return {"text": text, "segments": segments, "language": language}
+
+def _transcribe_file(source, language=None, model=None, log_mel=None):
+    # source: a wav path, or 16 kHz mono PCM bytes (handed to Whisper as samples, no ffmpeg);
+    # log_mel: precomputed features for source, used instead of recomputing them when given
+    if STT_ENGINE == "stub":
+        return _stub_transcribe(source)
+    whisper_model = get_whisper_model()
+    if whisper_model is None:
+        return {"error": "model_loading" if whisper_loading() else "whisper_unavailable"}
+    model = model or whisper_model
+    if log_mel is not None and log_mel.shape[0] == model.dims.n_mels:
+        try:
+            with timed("whisper"):
+                res = _transcribe_mel(log_mel, language=language, model=model)
+            return {"transcript": res["text"].strip(), "raw": res}
+        except Exception as e:
+            print("precomputed log-mel decode failed, transcribing audio instead:", e)
     try:
-        res = whisper_model.transcribe(path, fp16=False)
+        with timed("whisper"):
+            # a known language skips Whisper's own detection pass
+            audio = pcm_to_audio(source) if isinstance(source, (bytes, bytearray)) else source
+            res = model.transcribe(audio, fp16=False, language=language)
         return {"transcript": res.get("text","").strip(), "raw": res}
     except Exception as e:
         return {"error": "whisper_failed", "detail": str(e)}
 
+def _detect_language(pcm_bytes):
+    """Run Whisper language ID on a chunk. Returns (lang, probability) or (None, 0.0)."""
+    whisper_model = get_whisper_model()
+    if STT_ENGINE == "stub" or whisper_model is None:
+        return None, 0.0
+    try:
+        import whisper
+        with timed("language_detect"):
+            audio = whisper.pad_or_trim(pcm_to_audio(pcm_bytes))
+            mel = whisper.log_mel_spectrogram(audio, n_mels=whisper_model.dims.n_mels).to(whisper_model.device)
+            _, probs = whisper_model.detect_language(mel)
+        lang = max(probs, key=probs.get)
+        return lang, float(probs[lang])
+    except Exception as e:
+        print("language detection failed:", e)
+        return None, 0.0
+
+def _normalize_language(value):
+    """Whisper language code for a client value ("hi", "Hindi", "auto"), or None when Whisper doesn't know it."""
+    value = value.strip().lower()
+    if value == "auto":
+        return value
+    try:
+        from whisper.tokenizer import LANGUAGES, TO_LANGUAGE_CODE
+    except ImportError:
+        return value   # no Whisper (stub engine): nothing to validate against
+    if value in LANGUAGES:
+        return value
+    return TO_LANGUAGE_CODE.get(value)
+
+def _language_for_chunk(session_id, override, pcm_bytes):
+    """
+    Decide the language to transcribe this chunk with.
+    override: client-supplied code ("auto" clears a previous override).
+    Returns (language or None, source).
+    """
+    with _LOCK:
+        state = _get_meta(session_id)["language"]
+        if override:
+            override = override.strip().lower()
+            if override == "auto":
+                if state["source"] == "client":
+                    state.update(pinned=None, source="auto", votes={}, low_conf_streak=0)
+            else:
+                state.update(pinned=override, source="client", votes={}, low_conf_streak=0)
+        if state["pinned"]:
+            return state["pinned"], state["source"]
+
+    # unpinned: detect once here and hand the result to transcribe (no second detection)
+    lang, prob = _detect_language(pcm_bytes)
+    if lang is None:
+        return None, "auto"
+    with _LOCK:
+        state = _get_meta(session_id)["language"]
+        if not state["pinned"] and prob >= LANG_PIN_CONFIDENCE:
+            state["votes"][lang] = state["votes"].get(lang, 0) + 1
+            if state["votes"][lang] >= LANG_PIN_VOTES:
+                state.update(pinned=lang, source="detected", votes={}, low_conf_streak=0)
+                print(f"[LANG] session={session_id} pinned language={lang}")
+    return lang, "detected"
+
+def _update_language_confidence(session_id, raw):
+    """Unpin an auto-detected language when transcription confidence stays low."""
+    segments = (raw or {}).get("segments") or []
+    logprobs = [seg["avg_logprob"] for seg in segments if "avg_logprob" in seg]
+    if not logprobs:
+        return
+    confidence = sum(logprobs) / len(logprobs)
+    with _LOCK:
+        state = _get_meta(session_id)["language"]
+        if state["source"] != "detected" or not state["pinned"]:
+            return
+        if confidence < LANG_REDETECT_LOGPROB:
+            state["low_conf_streak"] += 1
+            if state["low_conf_streak"] >= LANG_REDETECT_STREAK:
+                print(f"[LANG] session={session_id} unpinned language={state['pinned']} (avg_logprob={confidence:.2f})")
+                state.update(pinned=None, source="auto", votes={}, low_conf_streak=0)
+        else:
+            state["low_conf_streak"] = 0
+
+def _translation_context(session_id, tgt_lang=None):
+    """Per-session translation context; a new tgt_lang replaces the sticky one and resets the cache."""
+    with _LOCK:
+        ctx = _get_meta(session_id)["translation"]
+        if tgt_lang:
+            tgt_lang = tgt_lang.strip().lower()
+            if tgt_lang != ctx["tgt_lang"]:
+                ctx["tgt_lang"] = tgt_lang
+                ctx["done"].clear()
+        return ctx
+
+def _segment_texts(result):
+    raw = result.get("raw") or {}
+    segments = [seg.get("text", "").strip() for seg in (raw.get("segments") or [])]
+    segments = [t for t in segments if t]
+    if not segments and result.get("transcript"):
+        segments = [result["transcript"]]
+    return segments
+
+def _translate_new_segments(ctx, segments, src_lang):
+    """
+    Translate only the segments this session has not translated yet.
+    Returns { translation, segments: [{src, tgt, cached}], mt_meta } or None when no target language is set.
+    """
+    tgt_lang = ctx["tgt_lang"]
+    if not tgt_lang or not segments:
+        return None
+    src_lang = (src_lang or "en").lower()
+    out = []
+    methods = set()
+    for text in segments:
+        key = (src_lang, text)
+        with _LOCK:
+            cached = ctx["done"].get(key)
+        if cached is not None:
+            out.append({"src": text, "tgt": cached, "cached": True})
+            continue
+        if src_lang[:2] == tgt_lang[:2]:
+            translation, method = text, "identity"
+        else:
+            try:
+                with mt_admission.slot(client_key()), timed("translate"):
+                    mt = translate_text(text, src_lang, tgt_lang)
+            except Overloaded:
+                # MT backlog: caption goes out untranslated now, the segment is retried on a later flush
+                mt = {"translation": None, "method": "skipped_overload"}
+            translation, method = mt["translation"], mt["method"]
+            if method in ("none", "skipped_overload"):
+                # don't remember "no model" placeholders; a model may be added later
+                out.append({"src": text, "tgt": translation, "cached": False})
+                methods.add(method)
+                continue
+        methods.add(method)
+        with _LOCK:
+            ctx["done"][key] = translation
+            ctx["segments_translated"] += 1
+            while len(ctx["done"]) > TRANSLATION_CONTEXT_MAX:
+                ctx["done"].popitem(last=False)
+        out.append({"src": text, "tgt": translation, "cached": False})
+    return {
+        "translation": " ".join(seg["tgt"] for seg in out if seg["tgt"]),
+        "segments": out,
+        "mt_meta": {"tgt_lang": tgt_lang, "methods": sorted(methods)},
+    }
+
+def _raw_int(name, header):
+    # query arg, then header, then content-type parameter (audio/L16; rate=16000; channels=1)
+    value = request.args.get(name) or request.headers.get(header) or request.mimetype_params.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return -1
+
+def _read_limited(stream, limit):
+    parts, size = [], 0
+    while size < limit:
+        block = stream.read(min(64 * 1024, limit - size))
+        if not block:
+            break
+        parts.append(block)
+        size += len(block)
+    return b"".join(parts)
+
+def _read_raw_chunk():
+    """
+    Non-multipart bodies. WAV is parsed in-process (other WAV encodings and recognised
+    compressed containers go through ffmpeg); headerless s16le PCM must declare its
+    layout via ?rate=&channels= (or X-Sample-Rate / X-Channels, or audio/L16
+    content-type parameters). Returns (pcm, None) or (None, error response).
+    """
+    if request.content_length and request.content_length > RAW_CHUNK_MAX_BYTES:
+        return None, (jsonify({"error":"chunk_too_large", "max_bytes": RAW_CHUNK_MAX_BYTES}), 413)
+    if request.content_length is None:
+        # chunked / unsized body: never read more than one byte past the limit
+        data = _read_limited(request.stream, RAW_CHUNK_MAX_BYTES + 1)
+    else:
+        data = request.get_data(cache=False)
+    if len(data) > RAW_CHUNK_MAX_BYTES:
+        return None, (jsonify({"error":"chunk_too_large", "max_bytes": RAW_CHUNK_MAX_BYTES}), 413)
+    if not data:
+        return None, (jsonify({"error":"no_file"}), 400)
+    head = data[:12]
+    rate = _raw_int("rate", "X-Sample-Rate")
+    channels = _raw_int("channels", "X-Channels") or 1
+    if is_wav_header(head):
+        try:
+            pcm, wav_rate, wav_channels = parse_wav_bytes(data)
+            return to_pipeline_pcm(pcm, wav_rate, wav_channels), None
+        except ValueError:
+            pass   # 24-bit / float WAV: ffmpeg, as on the multipart path
+    # a declared rate means headerless PCM (whose samples can look like an MPEG frame sync);
+    # otherwise only a recognised container is decoded, never guessed at as 16 kHz PCM
+    if is_wav_header(head) or (rate is None and is_container_header(head)):
+        try:
+            return decode_bytes(data), None
+        except Exception as e:
+            if is_wav_header(head):
+                return None, (jsonify({"error":"ffmpeg_failed", "detail": str(e)}), 500)
+            # the sniff may have matched headerless PCM (frame sync is only 11 bits)
+            return None, (jsonify({"error":"missing_rate", "detail":"body is neither a decodable container nor "
+                                   "declared PCM; pass ?rate= for headerless PCM"}), 400)
+    if rate is None:
+        return None, (jsonify({"error":"missing_rate", "detail":"headerless PCM needs ?rate= (and ?channels= if not mono)"}), 400)
+    if not (RAW_MIN_RATE <= rate <= RAW_MAX_RATE) or not (1 <= channels <= RAW_MAX_CHANNELS):
+        return None, (jsonify({"error":"invalid_pcm_format", "rate": rate, "channels": channels}), 400)
+    return to_pipeline_pcm(data, rate, channels), None
+
+def _read_chunk_pcm():
+    """16 kHz mono s16 PCM for this chunk. Returns (pcm, None) or (None, error response)."""
+    if request.mimetype in RAW_PCM_MIMETYPES:
+        with timed("decode"):
+            pcm, error = _read_raw_chunk()
+        if error is None:
+            inc("echoverse_decode_total", path="raw")
+        return pcm, error
+    # receive() already streamed the file into a per-upload scratch dir; WAV parts are
+    # converted in-process, compressed formats (m4a, caf, ...) go through ffmpeg.
+    # The scratch dir is removed when the request closes
+    files = request.files
+    if "file" not in files:
+        return None, (jsonify({"error":"no_file"}), 400)
+    upload = get_upload(files["file"])
+    try:
+        with timed("decode"):
+            return upload.pcm(target_rate=SAMPLE_RATE), None
+    except Exception as e:
+        return None, (jsonify({"error":"ffmpeg_failed", "detail": str(e)}), 500)
+
+def _buffered_seconds():
+    with _LOCK:
+        total = sum(len(b) for b in _BUFFERS.values())
+    return total / (SAMPLE_RATE * BYTES_PER_SAMPLE)
+
+register_gauge("echoverse_active_sessions", lambda: len(_BUFFERS_META), "Live caption sessions with buffered state")
+register_gauge("echoverse_buffered_audio_seconds", _buffered_seconds, "Seconds of PCM waiting in session buffers")
+
 # cleanup daemon to purge old sessions
 def _cleanup_worker():
     while True:
@@ -140,10 +603,23 @@ def _cleanup_worker():
             for sid in to_delete:
                 _BUFFERS.pop(sid, None)
                 _BUFFERS_META.pop(sid, None)
+                _FEATURES.pop(sid, None)
+            for sid, state in list(_SEQUENCES.items()):
+                if not state["in_flight"] and now - state["last_active"] > 60:
+                    _SEQUENCES.pop(sid, None)
+        transcript_cache.purge_expired()
         time.sleep(15)
 
-cleanup_thread = threading.Thread(target=_cleanup_worker, daemon=True)
-cleanup_thread.start()
+cleanup_thread = None
+
+def start_cleanup_worker():
+    """Start the session purge daemon once (from warm-up, not at import)."""
+    global cleanup_thread
+    with _LOCK:
+        if cleanup_thread is None:
+            cleanup_thread = threading.Thread(target=_cleanup_worker, daemon=True, name="chunk-cleanup")
+            cleanup_thread.start()
+    return cleanup_thread
 
 # @chunk_bp.route("/chunk", methods=["POST"])
 # def receive_chunk():
@@ -295,39 +771,198 @@ cleanup_thread.start()
 #     return jsonify({"status":"buffered"})
 
 
+def _chunk_seq():
+    value = request.args.get("seq") or request.headers.get("X-Chunk-Seq")
+    if value is None or value == "":
+        return None
+    try:
+        seq = int(value)
+    except ValueError:
+        return -1
+    return seq
+
+def _advance(state):
+    # caller must hold _LOCK
+    while state["next"] in state["seen"]:
+        state["seen"].discard(state["next"])
+        state["next"] += 1
+
+def _accept_seq(session_id, seq):
+    """
+    Admit one sequenced chunk. Returns (state, late, None) when the chunk should be
+    processed, or (None, False, response) when it is answered without processing.
+    """
+    with _SEQ_COND:
+        state = _get_sequence(session_id)
+        state["last_active"] = time.time()
+        cached = state["results"].get(seq)
+        if cached is not None:
+            inc("echoverse_chunk_seq_total", outcome="duplicate")
+            return None, False, (jsonify({**cached, "duplicate": True}), 200)
+        if seq in state["in_flight"]:
+            inc("echoverse_chunk_seq_total", outcome="in_progress")
+            resp = jsonify({"error":"chunk_in_progress", "seq": seq})
+            resp.status_code = 409
+            resp.headers["Retry-After"] = "1"
+            return None, False, resp
+        if seq < state["next"] and seq not in state["missing"]:
+            # processed earlier and its result already evicted: still never transcribed twice
+            inc("echoverse_chunk_seq_total", outcome="stale")
+            return None, False, (jsonify({"status":"duplicate", "seq": seq, "duplicate": True}), 200)
+
+        # in flight from here on, including while it waits below, so a retry gets the 409
+        state["in_flight"].add(seq)
+        late = seq in state["missing"]
+        if late:
+            state["missing"].discard(seq)
+            inc("echoverse_chunk_seq_total", outcome="late")
+        else:
+            state["seen"].add(seq)
+            _advance(state)
+            _SEQ_COND.notify_all()
+            if seq > state["next"]:
+                # overtook an earlier chunk: hold (before reading the body) until it shows up
+                inc("echoverse_chunk_seq_total", outcome="reordered")
+                deadline = time.time() + CHUNK_REORDER_WAIT
+                while seq > state["next"] and time.time() < deadline:
+                    _SEQ_COND.wait(deadline - time.time())
+                if seq > state["next"]:
+                    inc("echoverse_chunk_seq_total", outcome="gap_timeout")
+                    # only the most recent gap stays eligible for late processing
+                    gap = range(max(state["next"], seq - CHUNK_RESULTS_MAX), seq)
+                    state["missing"].update(n for n in gap if n not in state["seen"])
+                    state["seen"] = {n for n in state["seen"] if n >= seq}
+                    state["next"] = seq
+                    _advance(state)
+                    _SEQ_COND.notify_all()
+        return state, late, None
+
+def _finish_seq(state, seq, resp):
+    body = resp.get_json(silent=True) if resp.status_code == 200 else None
+    with _SEQ_COND:
+        state["in_flight"].discard(seq)
+        state["last_active"] = time.time()
+        if isinstance(body, dict):
+            state["results"][seq] = body
+            while len(state["results"]) > CHUNK_RESULTS_MAX:
+                state["results"].popitem(last=False)
+        else:
+            # failed (429 / 503 / 500): let the client's retry of this seq through
+            state["missing"].add(seq)
+
+def sequenced(view):
+    """
+    Idempotent chunk uploads. With ?seq= (or X-Chunk-Seq) and ?session_id= in the URL,
+    duplicates are answered before the body is read, decoded or queued for STT.
+    Without seq the view runs as before.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        seq = _chunk_seq()
+        if seq is None:
+            return view(*args, **kwargs)
+        if seq < 0:
+            return jsonify({"error":"invalid_seq"}), 400
+        session_id = request.args.get("session_id") or request.headers.get("X-Session-Id")
+        if not session_id:
+            # the form isn't parsed yet (that would mean receiving and decoding the upload)
+            return jsonify({"error":"missing_session_id", "detail":"pass session_id in the query string with seq"}), 400
+        resp = make_response(jsonify({"error":"chunk_failed"}), 500)
+        state, late, answered = _accept_seq(session_id, seq)
+        if answered is not None:
+            return answered
+        try:
+            resp = make_response(view(*args, **kwargs))
+            body = resp.get_json(silent=True)
+            if isinstance(body, dict):
+                body["seq"] = seq
+                if late:
+                    body["late"] = True
+                resp.set_data(jsonify(body).get_data())
+            return resp
+        finally:
+            _finish_seq(state, seq, resp)
+    return wrapped
+
+
 @chunk_bp.route("/chunk", methods=["POST"])
+@sequenced
+@receive(stt_admission)
+@streaming_decode
 def receive_chunk_test_transcribe_every_chunk():
-    session_id = request.form.get("session_id") or request.args.get("session_id") or "default"
-    if "file" not in request.files:
-        return jsonify({"error":"no_file"}), 400
-    file = request.files["file"]
-    filename = secure_filename(file.filename or "chunk")
-    ext = os.path.splitext(filename)[1].lower()
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
-    tmp_path = tmp.name
-    tmp.close()
-    file.save(tmp_path)
+    pcm, error = _read_chunk_pcm()
+    if error is not None:
+        return error
+    session_id = request.args.get("session_id") or request.form.get("session_id") or "default"
+    # an unknown code would be pinned and fail every later chunk of the session in Whisper
+    override = request.form.get("language") or request.args.get("language")
+    if override:
+        language_code = _normalize_language(override)
+        if language_code is None:
+            return jsonify({"error":"invalid_language", "language": override}), 400
+        override = language_code
+    inc("echoverse_audio_seconds_total", len(pcm) / float(SAMPLE_RATE * BYTES_PER_SAMPLE), endpoint="chunk")
+
+    # cheap energy gate: silent chunks never reach Whisper
+    with timed("vad"):
+        speech_detected, vad_stats = _detect_speech(session_id, pcm)
+    if not speech_detected:
+        inc("echoverse_chunks_total", outcome="silence")
+        return jsonify({"status":"silence", "vad": vad_stats}), 200
+    inc("echoverse_chunks_total", outcome="speech")
+    if STT_ENGINE != "stub" and whisper_loading():
+        return model_loading_response()
 
-    try:
-        wav_path = ffmpeg_to_wav_bytes(tmp_path, target_rate=SAMPLE_RATE)
-    except Exception as e:
-        try: os.remove(tmp_path)
-        except: pass
-        return jsonify({"error":"ffmpeg_failed", "detail": str(e)}), 500
-    finally:
-        try: os.remove(tmp_path)
-        except: pass
-
-    # directly transcribe the single chunk file (no buffering)
-    try:
-        result = _transcribe_file(wav_path)
-    except Exception as e:
-        result = {"error": "transcription_exception", "detail": str(e)}
-    finally:
-        try: os.remove(wav_path)
-        except: pass
+    with _LOCK:
+        pinned = _get_meta(session_id)["language"]["pinned"]
+    # a retried chunk (same PCM, same language) is answered from the dedup cache
+    key_lang = override if override and override != "auto" else pinned
+    # degraded mode: while STT requests are queueing, live chunks use the smaller model
+    degraded_model = get_degraded_model() if STT_ENGINE != "stub" and stt_admission.overloaded() else None
+    if degraded_model is not None:
+        inc("echoverse_degraded_chunks_total")
+        model_name = DEGRADED_WHISPER_MODEL
+    else:
+        model_name = "stub" if STT_ENGINE == "stub" else WHISPER_MODEL_NAME
+    cache_key = audio_key(pcm, model_name, endpoint="chunk", language=key_lang)
+    result = transcript_cache.get(cache_key)
+
+    if result is not None:
+        language, language_source = result.get("language"), "cached"
+    else:
+        # the STT slot covers only the model work: decode, VAD and cache hits never wait for
+        # (or count toward the queue of) a Whisper slot
+        try:
+            with stt_admission.slot(client_key()):
+                if degraded_model is not None:
+                    # no extra language-ID pass under overload: use what the session already knows
+                    language, language_source = key_lang, "pinned" if key_lang else "auto"
+                else:
+                    language, language_source = _language_for_chunk(session_id, override, pcm)
+
+                # directly transcribe the single chunk file (no buffering)
+                try:
+                    result = _transcribe_file(pcm, language=language, model=degraded_model)
+                except Exception as e:
+                    result = {"error": "transcription_exception", "detail": str(e)}
+        except Overloaded as e:
+            return overloaded_response(e)
+        if "transcript" in result:
+            # buffered for /api/flush, which finalizes the utterance in one pass (cached
+            # results are retries of a chunk that is already buffered)
+            _append_to_buffer(session_id, pcm)
+            if degraded_model is None:
+                _update_language_confidence(session_id, result.get("raw"))
+            language = language or (result.get("raw") or {}).get("language")
+            transcript_cache.put(cache_key, {**result, "language": language})
 
     if "transcript" in result:
-        return jsonify({"status":"final", "transcript": result["transcript"], "raw": result.get("raw")}), 200
+        body = {"status":"final", "transcript": result["transcript"], "raw": result.get("raw"),
+                "language": language, "language_source": language_source, "degraded": degraded_model is not None}
+        ctx = _translation_context(session_id, request.form.get("tgt_lang") or request.args.get("tgt_lang"))
+        mt = _translate_new_segments(ctx, _segment_texts(result), language)
+        if mt:
+            body.update(mt)
+        return jsonify(body), 200
     else:
         return jsonify({"status":"error", **result}), 500
@@ -9,5 +9,60 @@ SECRET_KEY = os.getenv("SECRET_KEY", "supersecret")
 BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
 ACCESS_TOKEN_EXPIRES = int(os.getenv("ACCESS_TOKEN_EXPIRES", "3600"))
 
+# Observability: set METRICS_ENABLED=0 to turn instrumentation into no-ops
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Admin endpoints (profiler) require this token in the X-Admin-Token header; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+
+# Whisper checkpoint for /api/stt, /api/process and the live path
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "small")
+
+# Background warm-up: Marian pairs to preload ("src-tgt", comma-separated) and whether
+# /readyz also requires them (otherwise readiness only waits for Whisper)
+WARMUP_TRANSLATION_PAIRS = [p.strip() for p in os.getenv("WARMUP_TRANSLATION_PAIRS", "en-hi,hi-en").split(",") if p.strip()]
+READY_REQUIRES_TRANSLATION = os.getenv("READY_REQUIRES_TRANSLATION", "0") == "1"
+# WARMUP_ENABLED=0 loads nothing in the background (offline harnesses such as
+# loadtest.py --in-process --stub-stt). Whisper is then loaded by the first request that
+# needs it, or reported as disabled under STT_ENGINE=stub
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+
+# STT_ENGINE=stub replaces Whisper in the live caption path with a fixed-latency fake,
+# so transport and buffering can be load-tested without a model (see loadtest.py)
+STT_ENGINE = os.getenv("STT_ENGINE", "whisper")
+STT_STUB_LATENCY_MS = float(os.getenv("STT_STUB_LATENCY_MS", "50"))
+
+# Upload limits: whole request body, and in-memory size of non-file form fields
+# (file parts are streamed to a per-upload scratch dir, never held in memory)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(200 * 1024 * 1024)))
+UPLOAD_MAX_FORM_MEMORY = int(os.getenv("UPLOAD_MAX_FORM_MEMORY", str(512 * 1024)))
+# raw PCM / WAV bodies posted to /api/chunk are read into memory; cap them well below UPLOAD_MAX_BYTES
+RAW_CHUNK_MAX_BYTES = int(os.getenv("RAW_CHUNK_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Dedup cache for retried uploads (keyed by decoded PCM hash + model + options); 0 entries disables it
+TRANSCRIPT_CACHE_MAX_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", "512"))
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TRANSCRIPT_CACHE_TTL = int(os.getenv("TRANSCRIPT_CACHE_TTL", "600"))
+
+# Admission control: concurrent inference slots, per-user slots (0 = unlimited), bounded wait queue.
+# Requests that don't fit get 429 + Retry-After.
+# A user at their per-user limit gets 429 straight away (they don't queue), so keep it below
+# the global concurrency or one client can take every slot.
+ADMISSION_STT_CONCURRENCY = int(os.getenv("ADMISSION_STT_CONCURRENCY", "2"))
+ADMISSION_STT_PER_USER = int(os.getenv("ADMISSION_STT_PER_USER", "1"))
+ADMISSION_STT_QUEUE = int(os.getenv("ADMISSION_STT_QUEUE", "8"))
+# MT runs after STT in the same request; fewer slots than STT so a translation backlog shows up
+# here, and a short wait (seconds) before the text is returned untranslated
+ADMISSION_MT_CONCURRENCY = int(os.getenv("ADMISSION_MT_CONCURRENCY", "1"))
+ADMISSION_MT_QUEUE = int(os.getenv("ADMISSION_MT_QUEUE", "16"))
+ADMISSION_MT_WAIT = float(os.getenv("ADMISSION_MT_WAIT", "0.5"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+# Degraded mode: live chunks switch to this smaller Whisper model while this many requests
+# are queued for STT (empty DEGRADED_WHISPER_MODEL disables it)
+DEGRADED_WHISPER_MODEL = os.getenv("DEGRADED_WHISPER_MODEL", "tiny")
+DEGRADED_QUEUE_THRESHOLD = int(os.getenv("DEGRADED_QUEUE_THRESHOLD", "2"))
+
 # Debug print (optional)
 print("DEBUG config: MONGO_URI=", MONGO_URI, " DB_NAME=", DB_NAME)
@@ -0,0 +1,324 @@
+# server/loadtest.py
+"""
+Live-caption load harness: N concurrent sessions posting ~1.5 s chunks to /api/chunk,
+then /api/flush, recording caption latency percentiles, error rates and server resources.
+
+Examples:
+  # against a running server (start it with STT_ENGINE=stub to benchmark transport only)
+  python loadtest.py --url http://localhost:8000 --sessions 20 --duration 60
+
+  # fully offline, in-process Flask app with the stubbed STT engine
+  python loadtest.py --in-process --stub-stt --sessions 20 --duration 30
+
+  # raw WAV request bodies (in-process decode fast path) instead of multipart
+  python loadtest.py --url http://localhost:8000 --raw
+
+  # replay recorded clips instead of synthesized audio
+  python loadtest.py --url http://localhost:8000 --replay-dir ./clips
+"""
+import os
+import io
+import re
+import sys
+import json
+import math
+import time
+import uuid
+import wave
+import random
+import struct
+import argparse
+import threading
+import urllib.request
+import urllib.error
+
+SAMPLE_RATE = 16000
+REPLAY_EXTS = {".wav", ".mp3", ".m4a", ".ogg", ".flac", ".aac", ".caf", ".webm"}
+
+
+# ---------------------
+# Audio sources
+# ---------------------
+def synth_chunk_wav(seconds, speech=True, seed=None):
+    """A 16 kHz mono s16 WAV: voiced-like harmonic bursts when speech=True, low noise otherwise."""
+    rng = random.Random(seed)
+    n = int(SAMPLE_RATE * seconds)
+    f0 = rng.uniform(100, 220)
+    samples = []
+    for i in range(n):
+        t = i / SAMPLE_RATE
+        noise = rng.gauss(0, 30)
+        if speech:
+            # syllable-rate (4 Hz) amplitude envelope over a few harmonics
+            env = 0.5 * (1 + math.sin(2 * math.pi * 4 * t))
+            tone = sum(math.sin(2 * math.pi * f0 * k * t) / k for k in (1, 2, 3))
+            value = 6000 * env * tone + noise
+        else:
+            value = noise
+        samples.append(max(-32768, min(32767, int(value))))
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes(struct.pack(f"<{len(samples)}h", *samples))
+    return buf.getvalue()
+
+
+class AudioSource:
+    def __init__(self, chunk_seconds, replay_dir=None, silence_ratio=0.3):
+        self.chunk_seconds = chunk_seconds
+        self.silence_ratio = silence_ratio
+        self.clips = []
+        if replay_dir:
+            for name in sorted(os.listdir(replay_dir)):
+                if os.path.splitext(name)[1].lower() in REPLAY_EXTS:
+                    with open(os.path.join(replay_dir, name), "rb") as fh:
+                        self.clips.append((name, fh.read()))
+            if not self.clips:
+                raise SystemExit(f"no audio files found in {replay_dir}")
+        else:
+            # pre-synthesize a small pool so generation cost stays out of the measurement
+            self.clips = [(f"speech{i}.wav", synth_chunk_wav(chunk_seconds, True, seed=i)) for i in range(4)]
+            self.clips += [(f"silence{i}.wav", synth_chunk_wav(chunk_seconds, False, seed=100 + i)) for i in range(2)]
+
+    def next(self, rng):
+        speech = [c for c in self.clips if not c[0].startswith("silence")] or self.clips
+        silence = [c for c in self.clips if c[0].startswith("silence")]
+        if silence and rng.random() < self.silence_ratio:
+            return rng.choice(silence)
+        return rng.choice(speech)
+
+
+# ---------------------
+# Transports
+# ---------------------
+def _multipart(fields, file_field, filename, data):
+    boundary = uuid.uuid4().hex
+    out = io.BytesIO()
+    for k, v in fields.items():
+        out.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{k}\"\r\n\r\n{v}\r\n".encode())
+    out.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{file_field}\"; filename=\"{filename}\"\r\n"
+              f"Content-Type: application/octet-stream\r\n\r\n".encode())
+    out.write(data)
+    out.write(f"\r\n--{boundary}--\r\n".encode())
+    return out.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+def _chunk_path(session_id, seq=None):
+    return f"/api/chunk?session_id={session_id}" + (f"&seq={seq}" if seq is not None else "")
+
+
+class HttpTransport:
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def post_chunk(self, session_id, filename, data, raw=False, seq=None):
+        # session_id (and seq) in the query, so admission control and duplicate detection work without parsing the body
+        path = _chunk_path(session_id, seq)
+        if raw:
+            # fast path: the WAV bytes are the request body, no multipart and no ffmpeg on the server
+            return self._post(path, data, "application/octet-stream")
+        body, ctype = _multipart({"session_id": session_id}, "file", filename, data)
+        return self._post(path, body, ctype)
+
+    def flush(self, session_id):
+        return self._post(f"/api/flush?session_id={session_id}", json.dumps({"session_id": session_id}).encode(), "application/json")
+
+    def metrics(self):
+        try:
+            with urllib.request.urlopen(self.base_url + "/metrics", timeout=self.timeout) as resp:
+                return resp.read().decode("utf-8", errors="ignore")
+        except Exception:
+            return ""
+
+    def _post(self, path, body, ctype):
+        req = urllib.request.Request(self.base_url + path, data=body, headers={"Content-Type": ctype}, method="POST")
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.status, json.loads(resp.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            try:
+                payload = json.loads(e.read() or b"{}")
+            except ValueError:
+                payload = {}
+            return e.code, payload
+        except Exception as e:
+            return 0, {"error": "transport_failed", "detail": str(e)}
+
+
+class InProcessTransport:
+    """Drives the Flask app through its test client: no sockets, no external services."""
+
+    def __init__(self):
+        from app import app
+        self.app = app
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, "client"):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def post_chunk(self, session_id, filename, data, raw=False, seq=None):
+        if raw:
+            resp = self._client().post(_chunk_path(session_id, seq), data=data,
+                                       content_type="application/octet-stream")
+        else:
+            resp = self._client().post(_chunk_path(session_id, seq),
+                                       data={"session_id": session_id, "file": (io.BytesIO(data), filename)},
+                                       content_type="multipart/form-data")
+        return resp.status_code, resp.get_json(silent=True) or {}
+
+    def flush(self, session_id):
+        resp = self._client().post(f"/api/flush?session_id={session_id}", json={"session_id": session_id})
+        return resp.status_code, resp.get_json(silent=True) or {}
+
+    def metrics(self):
+        return self._client().get("/metrics").get_data(as_text=True)
+
+
+# ---------------------
+# Load generation
+# ---------------------
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {"chunk": [], "retry": [], "flush": []}
+        self.statuses = {}
+        self.errors = 0
+        self.requests = 0
+
+    def record(self, kind, latency, status, payload):
+        with self.lock:
+            self.requests += 1
+            self.latencies[kind].append(latency)
+            label = f"{kind}:{status}:{payload.get('status', payload.get('error', ''))}"
+            self.statuses[label] = self.statuses.get(label, 0) + 1
+            if status != 200 or "error" in payload:
+                self.errors += 1
+
+
+def run_session(idx, transport, source, args, results, start_at):
+    rng = random.Random(args.seed + idx)
+    session_id = f"load-{idx}-{uuid.uuid4().hex[:8]}"
+    # stagger session start so chunk arrivals are not synchronized across sessions
+    tick = start_at + rng.uniform(0, args.chunk_seconds)
+    end_at = start_at + args.duration
+    seq = 0
+    while tick < end_at:
+        # the clip is "captured" during [tick - chunk_seconds, tick]; upload at tick
+        delay = tick - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        name, data = source.next(rng)
+        # only WAV clips can go as raw bodies; compressed replays stay multipart
+        raw = args.raw and name.lower().endswith(".wav")
+        status, payload = transport.post_chunk(session_id, name, data, raw=raw, seq=seq)
+        # caption latency: from end of captured audio to caption received
+        results.record("chunk", time.time() - tick, status, payload)
+        if args.retry_ratio and rng.random() < args.retry_ratio:
+            # simulate a client retry (lost response): the server should answer from its seq cache
+            t0 = time.time()
+            status, payload = transport.post_chunk(session_id, name, data, raw=raw, seq=seq)
+            results.record("retry", time.time() - t0, status, payload)
+        seq += 1
+        tick += args.chunk_seconds
+    t0 = time.time()
+    status, payload = transport.flush(session_id)
+    results.record("flush", time.time() - t0, status, payload)
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100.0
+    lo, hi = int(math.floor(k)), int(math.ceil(k))
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def scrape_value(text, name):
+    m = re.search(rf"^{re.escape(name)} ([0-9.eE+-]+)$", text, re.MULTILINE)
+    return float(m.group(1)) if m else None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Live-caption load harness for /api/chunk + /api/flush")
+    target = ap.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="server base URL, e.g. http://localhost:8000")
+    target.add_argument("--in-process", action="store_true", help="drive the Flask app in this process")
+    ap.add_argument("--stub-stt", action="store_true", help="use the stub STT engine (in-process only; "
+                    "for a remote server start it with STT_ENGINE=stub)")
+    ap.add_argument("--stub-latency-ms", type=float, default=50.0)
+    ap.add_argument("--sessions", type=int, default=10)
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds of audio per session")
+    ap.add_argument("--chunk-seconds", type=float, default=1.5)
+    ap.add_argument("--silence-ratio", type=float, default=0.3, help="fraction of synthesized chunks that are silent")
+    ap.add_argument("--replay-dir", help="directory of audio clips to replay instead of synthesized audio")
+    ap.add_argument("--raw", action="store_true", help="post WAV chunks as raw application/octet-stream bodies")
+    ap.add_argument("--retry-ratio", type=float, default=0.0, help="fraction of chunks re-sent with the same seq")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="write the JSON report here as well as stdout")
+    args = ap.parse_args(argv)
+
+    if args.in_process:
+        if args.stub_stt:
+            os.environ["STT_ENGINE"] = "stub"
+            os.environ["STT_STUB_LATENCY_MS"] = str(args.stub_latency_ms)
+            # transport only: no model loads or Mongo pings in the background while measuring
+            os.environ["WARMUP_ENABLED"] = "0"
+        transport = InProcessTransport()
+    else:
+        transport = HttpTransport(args.url)
+
+    source = AudioSource(args.chunk_seconds, args.replay_dir, args.silence_ratio)
+    results = Results()
+
+    before = transport.metrics()
+    start_at = time.time() + 0.5
+    threads = [threading.Thread(target=run_session, args=(i, transport, source, args, results, start_at), daemon=True)
+               for i in range(args.sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.time() - start_at
+    after = transport.metrics()
+
+    report = {
+        "sessions": args.sessions,
+        "duration_s": args.duration,
+        "chunk_seconds": args.chunk_seconds,
+        "wall_s": round(wall, 3),
+        "requests": results.requests,
+        "errors": results.errors,
+        "error_rate": round(results.errors / results.requests, 4) if results.requests else 0.0,
+        "statuses": results.statuses,
+        "latency_s": {
+            kind: {f"p{p}": percentile(vals, p) for p in (50, 90, 95, 99)} | {"max": max(vals) if vals else None}
+            for kind, vals in results.latencies.items()
+        },
+        # a session keeps up when its chunks are answered faster than they are produced
+        "realtime_ok": (percentile(results.latencies["chunk"], 95) or 0) < args.chunk_seconds,
+    }
+    cpu0, cpu1 = scrape_value(before, "process_cpu_seconds_total"), scrape_value(after, "process_cpu_seconds_total")
+    if cpu0 is not None and cpu1 is not None:
+        report["server"] = {
+            "cpu_seconds": round(cpu1 - cpu0, 3),
+            "cpu_utilization": round((cpu1 - cpu0) / wall, 3) if wall > 0 else None,
+            "max_rss_bytes": scrape_value(after, "process_max_resident_memory_bytes"),
+            "threads": scrape_value(after, "process_threads"),
+        }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text + "\n")
+    return 0 if results.errors == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
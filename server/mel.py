@@ -0,0 +1,99 @@
+# server/mel.py
+"""
+Whisper's log-mel front end, computed incrementally as session audio arrives so
+finalization only has to run the encoder/decoder.
+
+Matches whisper.audio.log_mel_spectrogram as called by whisper.transcribe:
+Hann-windowed STFT (n_fft=400, hop=160, centered with reflect padding), last frame
+dropped, mel projection, log10 clamped at 1e-10, then a global (max - 8) floor and
+(x + 4) / 4 scaling. transcribe() appends 30 s of silence before its STFT, so the
+final frames here are computed against zero padding as well.
+"""
+import threading
+import numpy as np
+
+SAMPLE_RATE = 16000
+N_FFT = 400
+HOP_LENGTH = 160
+N_FRAMES = 3000          # frames per 30 s encoder window
+FRAMES_PER_SECOND = SAMPLE_RATE // HOP_LENGTH
+
+_FILTERS = {}
+_WINDOW = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(N_FFT) / N_FFT)).astype(np.float32)  # periodic Hann
+
+
+def mel_filters(n_mels):
+    """Whisper's own mel filterbank (ships with the whisper package). Raises ImportError without it."""
+    if n_mels not in _FILTERS:
+        from whisper.audio import mel_filters as whisper_mel_filters
+        _FILTERS[n_mels] = whisper_mel_filters("cpu", n_mels).numpy()
+    return _FILTERS[n_mels]
+
+
+class IncrementalLogMel:
+    """
+    Emits log-mel frames as soon as their 400-sample window is fully buffered and keeps
+    only the unconsumed audio tail. finalize() computes the last few frames and applies
+    the utterance-wide normalization, which needs the global max.
+    """
+
+    def __init__(self, n_mels=80):
+        self.n_mels = n_mels
+        self.lock = threading.Lock()
+        self._filters = mel_filters(n_mels)
+        self._pending = np.zeros(0, dtype=np.float32)   # padded-domain samples from the next frame's start
+        self._started = False                          # reflect prefix applied
+        self._frames = []                              # (n_mels, k) log10 blocks, before normalization
+        self.n_frames = 0
+        self.n_samples = 0
+
+    def _emit(self, padded, limit=None):
+        n = 1 + (len(padded) - N_FFT) // HOP_LENGTH if len(padded) >= N_FFT else 0
+        if limit is not None:
+            n = min(n, limit)
+        if n > 0:
+            windows = np.lib.stride_tricks.sliding_window_view(padded, N_FFT)[::HOP_LENGTH][:n]
+            power = np.abs(np.fft.rfft(windows * _WINDOW, axis=-1)) ** 2
+            mel = self._filters @ power.T.astype(np.float32)
+            self._frames.append(np.log10(np.maximum(mel, 1e-10)))
+            self.n_frames += n
+            padded = padded[n * HOP_LENGTH:]
+        self._pending = padded
+
+    def _start(self, audio):
+        # center=True: frame t is centered on sample t * hop, the start reflect-padded by n_fft // 2
+        half = N_FFT // 2
+        self._pending = np.concatenate([audio[1:half + 1][::-1], self._pending])
+        self._started = True
+
+    def append(self, pcm_bytes):
+        x = np.frombuffer(pcm_bytes, dtype="<i2").astype(np.float32) / 32768.0
+        self.n_samples += len(x)
+        self._pending = np.concatenate([self._pending, x])
+        if not self._started:
+            if len(self._pending) <= N_FFT // 2:
+                return
+            self._start(self._pending)
+        self._emit(self._pending)
+
+    def finalize(self):
+        """Normalized (n_mels, n_samples // hop) float32 log-mel for everything appended, or None if empty."""
+        n_content = self.n_samples // HOP_LENGTH
+        if n_content == 0:
+            return None
+        if not self._started:
+            self._start(np.concatenate([self._pending, np.zeros(N_FFT, dtype=np.float32)]))
+        self._emit(np.concatenate([self._pending, np.zeros(N_FFT, dtype=np.float32)]),
+                   limit=n_content - self.n_frames)
+        log_spec = np.concatenate(self._frames, axis=1)[:, :n_content]
+        log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
+        return ((log_spec + 4.0) / 4.0).astype(np.float32)
+
+
+def silence_value(log_mel):
+    """
+    Normalized log-mel value of digital silence for this utterance: what the 30 s of zero
+    padding whisper.transcribe appends before its STFT turns into after the (max - 8)
+    floor, i.e. (max(raw_max - 8, log10(1e-10)) + 4) / 4. Used to pad short windows.
+    """
+    return max(float(log_mel.max()) - 2.0, -1.5)
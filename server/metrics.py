@@ -0,0 +1,211 @@
+# server/metrics.py
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from flask import Blueprint, Response, request, g
+from config import METRICS_ENABLED
+
+metrics_bp = Blueprint("metrics", __name__)
+
+# Histogram bucket upper bounds in seconds (covers ffmpeg / Whisper / Marian timings)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_LOCK = threading.Lock()
+_HISTOGRAMS = {}   # name -> { labels_tuple: {"buckets": [int], "sum": float, "count": int} }
+_COUNTERS = {}     # name -> { labels_tuple: float }
+_GAUGES = {}       # name -> { labels_tuple: float }
+_GAUGE_FNS = {}    # name -> callable returning float (evaluated at scrape time)
+_HELP = {
+    "echoverse_stage_duration_seconds": "Time spent in each pipeline stage",
+    "echoverse_request_duration_seconds": "End-to-end HTTP request latency per endpoint",
+    "echoverse_requests_total": "HTTP requests per endpoint and status code",
+    "echoverse_requests_in_flight": "Requests currently being handled per endpoint",
+    "echoverse_audio_seconds_total": "Seconds of audio processed per endpoint",
+    "echoverse_model_load_seconds": "Time taken to load each model",
+}
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    """Record a value into histogram `name`."""
+    if not METRICS_ENABLED:
+        return
+    key = _key(labels)
+    with _LOCK:
+        series = _HISTOGRAMS.setdefault(name, {})
+        h = series.get(key)
+        if h is None:
+            h = {"buckets": [0] * len(DEFAULT_BUCKETS), "sum": 0.0, "count": 0}
+            series[key] = h
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                h["buckets"][i] += 1
+                break
+        h["sum"] += value
+        h["count"] += 1
+
+
+def inc(name, amount=1, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = _key(labels)
+    with _LOCK:
+        series = _COUNTERS.setdefault(name, {})
+        series[key] = series.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    if not METRICS_ENABLED:
+        return
+    with _LOCK:
+        _GAUGES.setdefault(name, {})[_key(labels)] = value
+
+
+def add_gauge(name, amount, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = _key(labels)
+    with _LOCK:
+        series = _GAUGES.setdefault(name, {})
+        series[key] = series.get(key, 0) + amount
+
+
+def register_gauge(name, fn, help_text=None):
+    """Register a callable gauge evaluated lazily at scrape time (e.g. active sessions)."""
+    _GAUGE_FNS[name] = fn
+    if help_text:
+        _HELP[name] = help_text
+
+
+@contextmanager
+def timed(stage):
+    """
+    Time a pipeline stage:
+        with timed("whisper"):
+            whisper_model.transcribe(...)
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("echoverse_stage_duration_seconds", time.perf_counter() - start, stage=stage)
+
+
+def _fmt_labels(key, extra=None):
+    items = list(key) + (extra or [])
+    if not items:
+        return ""
+    parts = []
+    for k, v in items:
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def render():
+    """Render all metrics in the Prometheus text exposition format."""
+    lines = []
+    with _LOCK:
+        histograms = {n: {k: dict(v, buckets=list(v["buckets"])) for k, v in s.items()} for n, s in _HISTOGRAMS.items()}
+        counters = {n: dict(s) for n, s in _COUNTERS.items()}
+        gauges = {n: dict(s) for n, s in _GAUGES.items()}
+
+    for name, series in sorted(histograms.items()):
+        lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} histogram")
+        for key, h in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(DEFAULT_BUCKETS, h["buckets"]):
+                cumulative += n
+                lines.append(f"{name}_bucket{_fmt_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_fmt_labels(key, [('le', '+Inf')])} {h['count']}")
+            lines.append(f"{name}_sum{_fmt_labels(key)} {h['sum']}")
+            lines.append(f"{name}_count{_fmt_labels(key)} {h['count']}")
+
+    for name, series in sorted(counters.items()):
+        lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} counter")
+        for key, v in sorted(series.items()):
+            lines.append(f"{name}{_fmt_labels(key)} {v}")
+
+    for name, series in sorted(gauges.items()):
+        lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} gauge")
+        for key, v in sorted(series.items()):
+            lines.append(f"{name}{_fmt_labels(key)} {v}")
+
+    for name, fn in sorted(_GAUGE_FNS.items()):
+        try:
+            value = fn()
+        except Exception:
+            continue
+        lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _process_cpu_seconds():
+    t = os.times()
+    return t.user + t.system
+
+
+def _process_max_rss_bytes():
+    import resource  # not available on Windows; the gauge is skipped there
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+register_gauge("process_cpu_seconds_total", _process_cpu_seconds, "User + system CPU time of the server process")
+register_gauge("process_max_resident_memory_bytes", _process_max_rss_bytes, "Peak resident set size of the server process")
+register_gauge("process_threads", threading.active_count, "Live Python threads in the server process")
+
+
+def _endpoint_label():
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+def init_app(app):
+    """Attach per-endpoint latency / in-flight tracking to the Flask app."""
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+        g._metrics_endpoint = _endpoint_label()
+        add_gauge("echoverse_requests_in_flight", 1, endpoint=g._metrics_endpoint)
+
+    @app.after_request
+    def _metrics_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _metrics_end(exc):
+        start = g.pop("_metrics_start", None)
+        if start is None:
+            return
+        endpoint = g.pop("_metrics_endpoint", "unmatched")
+        status = g.pop("_metrics_status", 500)
+        add_gauge("echoverse_requests_in_flight", -1, endpoint=endpoint)
+        observe("echoverse_request_duration_seconds", time.perf_counter() - start, endpoint=endpoint, method=request.method)
+        inc("echoverse_requests_total", endpoint=endpoint, method=request.method, status=status)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    if not METRICS_ENABLED:
+        return Response("metrics disabled\n", status=404, mimetype="text/plain")
+    return Response(render(), mimetype="text/plain; version=0.0.4")
@@ -1,19 +1,42 @@
 # server/models.py (patch)
 
-from pymongo import MongoClient
 from bson.objectid import ObjectId
 from config import MONGO_URI, DB_NAME
 import bcrypt
 import time 
+import threading
 
-client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-db = client[DB_NAME]
+# The Mongo client is created on first use (or by the warm-up thread), not at import
+_client = None
+_CLIENT_LOCK = threading.Lock()
 
-users = db.users
-oauth_clients = db.oauth_clients
-oauth_codes = db.oauth_codes
-oauth_tokens = db.oauth_tokens
-transcripts = db.transcripts
+def get_db():
+    global _client
+    if _client is None:
+        with _CLIENT_LOCK:
+            if _client is None:
+                from pymongo import MongoClient
+                _client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+    return _client[DB_NAME]
+
+def ping():
+    """Round-trip to the server; raises if Mongo is unreachable."""
+    get_db().command("ping")
+    return True
+
+class _LazyCollection:
+    """Stands in for a pymongo Collection until the first attribute access."""
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self._name], attr)
+
+users = _LazyCollection("users")
+oauth_clients = _LazyCollection("oauth_clients")
+oauth_codes = _LazyCollection("oauth_codes")
+oauth_tokens = _LazyCollection("oauth_tokens")
+transcripts = _LazyCollection("transcripts")
 
 # helper to convert ObjectId -> str recursively for a doc
 def serialize_doc(doc):
@@ -94,3 +117,28 @@ def save_transcript(doc):
     doc["created_at"] = int(time.time())
     transcripts.insert_one(doc)
     return True
+
+def save_transcripts(docs):
+    """
+    Bulk variant of save_transcript for batch backfills: one round-trip per batch.
+    Each doc is upserted on (meta.path, tgt_lang) with $setOnInsert, so re-sending a
+    batch after a crash or a partial failure never duplicates a transcript.
+    Returns (saved, failed): docs now stored, and {index in docs: error} for the rest.
+    """
+    if not docs:
+        return 0, {}
+    from pymongo import UpdateOne
+    from pymongo.errors import BulkWriteError
+    now = int(time.time())
+    ops = []
+    for doc in docs:
+        doc["created_at"] = now
+        key = {"meta.path": doc["meta"]["path"], "tgt_lang": doc.get("tgt_lang")}
+        ops.append(UpdateOne(key, {"$setOnInsert": doc}, upsert=True))
+    try:
+        res = transcripts.bulk_write(ops, ordered=False)
+        return res.upserted_count + res.matched_count, {}
+    except BulkWriteError as e:
+        # ordered=False: every op without a write error was applied
+        failed = {err["index"]: err.get("errmsg", "write error") for err in e.details.get("writeErrors", [])}
+        return len(docs) - len(failed), failed
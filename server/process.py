@@ -1,11 +1,14 @@
 # server/process.py
 import os
-import tempfile
 from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
-from stt import WHISPER_AVAILABLE, whisper_model, allowed_file
+from stt import WHISPER_MODEL_NAME, get_whisper_model, whisper_loading, model_loading_response, allowed_file
 from translate import translate_text
 from models import save_transcript  # we'll add this helper
+from metrics import timed, inc
+from uploads import streaming_decode, get_upload, pcm_to_audio, SAMPLE_RATE
+from transcript_cache import transcript_cache, audio_key
+from admission import admit, stt_admission, mt_admission, client_key, Overloaded
 
 process_bp = Blueprint("process", __name__)
 
@@ -13,6 +16,8 @@ ALLOWED_EXT = {".wav", ".mp3", ".m4a", ".flac", ".ogg", ".caf"}
 
 
 @process_bp.route("/process", methods=["POST"])
+@admit(stt_admission)
+@streaming_decode
 def process_audio():
     """
     multipart/form-data:
@@ -20,22 +25,38 @@ def process_audio():
       - user_id: optional (string)
       - tgt_lang: target language code (e.g., "hi", "en")
     """
-    if "file" not in request.files:
+    # admit() already streamed the file into a per-upload scratch dir (and into ffmpeg)
+    files = request.files
+    if "file" not in files:
         return jsonify({"error": "no_file"}), 400
-    f = request.files["file"]
+    f = files["file"]
     filename = secure_filename(f.filename or "upload.wav")
     ext = os.path.splitext(filename)[1].lower()
     if ext not in ALLOWED_EXT:
         return jsonify({"error": "invalid_file"}), 400
-
-    tmp_dir = tempfile.gettempdir()
-    tmp_path = os.path.join(tmp_dir, filename)
-    f.save(tmp_path)
+    upload = get_upload(f)
+    # MT: determine target language
+    tgt_lang = request.form.get("tgt_lang") or request.args.get("tgt_lang") or "en"
+    user_id = request.form.get("user_id")
 
     # STT: whisper
-    if WHISPER_AVAILABLE and whisper_model is not None:
+    if whisper_loading():
+        return model_loading_response()
+    whisper_model = get_whisper_model()
+    if whisper_model is not None:
         try:
-            result = whisper_model.transcribe(tmp_path, fp16=False)
+            with timed("decode"):
+                pcm = upload.pcm()
+            # decoded length, as on /api/chunk (segment ends miss trailing silence)
+            inc("echoverse_audio_seconds_total", len(pcm) / float(SAMPLE_RATE * 2), endpoint="process")
+            # a retried upload of the same audio was already transcribed, translated and saved;
+            # user_id is part of the key so another user's upload still gets its own saved transcript
+            cache_key = audio_key(pcm, WHISPER_MODEL_NAME, endpoint="process", tgt_lang=tgt_lang, user_id=user_id)
+            cached = transcript_cache.get(cache_key)
+            if cached is not None:
+                return jsonify({**cached, "cached": True}), 200
+            with timed("whisper"):
+                result = whisper_model.transcribe(pcm_to_audio(pcm), fp16=False)
             transcript = result.get("text", "").strip()
             detected_lang = result.get("language", None)
         except Exception as e:
@@ -43,40 +64,39 @@ def process_audio():
     else:
         return jsonify({"error": "whisper_unavailable"}), 500
 
-    # MT: determine target language
-    tgt_lang = request.form.get("tgt_lang") or request.args.get("tgt_lang") or "en"
-    # translate
-    mt = translate_text(transcript, detected_lang or "en", tgt_lang)
+    # translate (under overload the transcript is returned untranslated rather than queued indefinitely)
+    try:
+        with mt_admission.slot(client_key()), timed("translate"):
+            mt = translate_text(transcript, detected_lang or "en", tgt_lang)
+    except Overloaded:
+        mt = {"translation": None, "used_model": None, "method": "skipped_overload"}
 
     # Save to DB (if user_id provided)
-    user_id = request.form.get("user_id")
     try:
         from models import save_transcript  # lazy import
-        save_transcript({
-            "user_id": user_id,
-            "src_text": transcript,
-            "tgt_text": mt["translation"],
-            "src_lang": detected_lang,
-            "tgt_lang": tgt_lang,
-            "meta": {
-                "mt_method": mt["method"],
-                "used_model": mt.get("used_model")
-            }
-        })
+        with timed("db_insert"):
+            save_transcript({
+                "user_id": user_id,
+                "src_text": transcript,
+                "tgt_text": mt["translation"],
+                "src_lang": detected_lang,
+                "tgt_lang": tgt_lang,
+                "meta": {
+                    "mt_method": mt["method"],
+                    "used_model": mt.get("used_model")
+                }
+            })
     except Exception as e:
         # non-fatal: continue but log
         print("Failed saving transcript:", e)
 
-    # Remove tmp file
-    try:
-        os.remove(tmp_path)
-    except:
-        pass
-
-    return jsonify({
+    body = {
         "transcript": transcript,
         "translation": mt["translation"],
         "language": detected_lang,
         "mt_meta": {"method": mt["method"], "used_model": mt.get("used_model")},
         "raw_result": result
-    }), 200
+    }
+    if mt["method"] != "skipped_overload":
+        transcript_cache.put(cache_key, body)
+    return jsonify(body), 200
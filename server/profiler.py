@@ -0,0 +1,157 @@
+# server/profiler.py
+import os
+import sys
+import time
+import secrets
+import threading
+from collections import OrderedDict
+from flask import Blueprint, Response, request, jsonify, g
+from config import PROFILE_MAX_SECONDS, PROFILE_INTERVAL_MS
+from utils import require_admin, admin_token_valid
+
+profiler_bp = Blueprint("profiler", __name__)
+
+# Only one whole-process capture at a time; per-request captures are independent
+_CAPTURE_LOCK = threading.Lock()
+
+# Recent per-request profiles: profile_id -> folded stacks text (bounded)
+_REQUEST_PROFILES = OrderedDict()
+_REQUEST_PROFILES_MAX = 32
+_PROFILES_LOCK = threading.Lock()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _fold(frame, thread_name):
+    # Walk leaf -> root, then emit root-first as flamegraph.pl expects
+    parts = []
+    while frame is not None:
+        parts.append(_frame_label(frame))
+        frame = frame.f_back
+    parts.append(thread_name)
+    parts.reverse()
+    return ";".join(p.replace(";", ":") for p in parts)
+
+
+class StackSampler(threading.Thread):
+    """
+    Periodically snapshots the Python stacks of other threads via sys._current_frames().
+    Only reads frame objects, so the profiled threads are never paused or instrumented.
+    """
+
+    def __init__(self, interval=0.01, thread_ids=None):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids else None
+        self.counts = {}
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.is_set():
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == own:
+                    continue
+                if self.thread_ids is not None and tid not in self.thread_ids:
+                    continue
+                stack = _fold(frame, names.get(tid, f"thread-{tid}"))
+                self.counts[stack] = self.counts.get(stack, 0) + 1
+            self.samples += 1
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def folded(self):
+        """Collapsed-stack output: one 'frame;frame;frame count' line per unique stack."""
+        return "\n".join(f"{stack} {n}" for stack, n in sorted(self.counts.items(), key=lambda kv: -kv[1])) + "\n"
+
+
+def _store_request_profile(profile_id, text):
+    with _PROFILES_LOCK:
+        _REQUEST_PROFILES[profile_id] = text
+        while len(_REQUEST_PROFILES) > _REQUEST_PROFILES_MAX:
+            _REQUEST_PROFILES.popitem(last=False)
+
+
+def init_app(app):
+    """
+    Per-request profiling: send `X-Profile: 1` together with a valid admin token and the
+    handling thread is sampled for the lifetime of the request. The response carries an
+    `X-Profile-Id` header; fetch the stacks from GET /admin/profile/<id>.
+    """
+
+    @app.before_request
+    def _profile_start():
+        if request.headers.get("X-Profile") != "1":
+            return
+        if not admin_token_valid(request):
+            return
+        sampler = StackSampler(interval=PROFILE_INTERVAL_MS / 1000.0, thread_ids=[threading.get_ident()])
+        sampler.start()
+        g._profile_sampler = sampler
+        g._profile_id = secrets.token_hex(8)
+
+    @app.after_request
+    def _profile_header(response):
+        profile_id = g.get("_profile_id")
+        if profile_id:
+            response.headers["X-Profile-Id"] = profile_id
+        return response
+
+    @app.teardown_request
+    def _profile_end(exc):
+        sampler = g.pop("_profile_sampler", None)
+        if sampler is None:
+            return
+        sampler.stop()
+        _store_request_profile(g.pop("_profile_id"), sampler.folded())
+
+
+@profiler_bp.route("/admin/profile", methods=["GET", "POST"])
+@require_admin
+def capture_profile():
+    """
+    Sample every thread for `seconds` (default 10) and return folded stacks
+    (text/plain, feed directly to flamegraph.pl or speedscope).
+    Query: seconds=<float>, interval_ms=<float>
+    """
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        interval_ms = float(request.args.get("interval_ms", PROFILE_INTERVAL_MS))
+    except ValueError:
+        return jsonify({"error": "invalid_params"}), 400
+    if seconds <= 0 or seconds > PROFILE_MAX_SECONDS or interval_ms <= 0:
+        return jsonify({"error": "invalid_params", "max_seconds": PROFILE_MAX_SECONDS}), 400
+
+    if not _CAPTURE_LOCK.acquire(blocking=False):
+        return jsonify({"error": "profile_in_progress"}), 409
+    try:
+        sampler = StackSampler(interval=interval_ms / 1000.0)
+        started = time.time()
+        sampler.start()
+        time.sleep(seconds)
+        sampler.stop()
+    finally:
+        _CAPTURE_LOCK.release()
+
+    resp = Response(sampler.folded(), mimetype="text/plain")
+    resp.headers["X-Profile-Samples"] = str(sampler.samples)
+    resp.headers["X-Profile-Duration"] = f"{time.time() - started:.3f}"
+    return resp
+
+
+@profiler_bp.route("/admin/profile/<profile_id>", methods=["GET"])
+@require_admin
+def get_request_profile(profile_id):
+    with _PROFILES_LOCK:
+        text = _REQUEST_PROFILES.get(profile_id)
+    if text is None:
+        return jsonify({"error": "not_found"}), 404
+    return Response(text, mimetype="text/plain")
@@ -1,19 +1,99 @@
 # server/stt.py
 import os
-import tempfile
+import time
+import threading
 from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
+from metrics import timed, inc, set_gauge
+from uploads import streaming_decode, get_upload, pcm_to_audio, SAMPLE_RATE
+from transcript_cache import transcript_cache, audio_key
+from admission import admit, stt_admission
+from config import WHISPER_MODEL, DEGRADED_WHISPER_MODEL
 
-# Optional: Whisper import (lazy load to avoid startup cost)
-try:
-    import whisper
-    WHISPER_AVAILABLE = True
-    # load a lightweight model initially for speed; change "small" -> "tiny" if required
-    whisper_model = whisper.load_model("small")
-except Exception as e:
-    WHISPER_AVAILABLE = False
-    whisper_model = None
-    print("Whisper not available:", e)
+WHISPER_MODEL_NAME = WHISPER_MODEL
+
+# Whisper is imported and loaded by the background warm-up (warmup.py), not at import
+# time, so the HTTP listener comes up without waiting for torch + model weights.
+WHISPER_AVAILABLE = False
+whisper_model = None
+WHISPER_STATE = "pending"   # pending | loading | ready | unavailable | disabled
+_WHISPER_LOCK = threading.Lock()
+_LOAD_ON_DEMAND = False     # warm-up is off: the first request that needs Whisper loads it
+
+def load_whisper():
+    """Import whisper and load the main model (idempotent; called from the warm-up thread)."""
+    global WHISPER_AVAILABLE, whisper_model, WHISPER_STATE
+    with _WHISPER_LOCK:
+        if WHISPER_STATE in ("ready", "unavailable", "disabled"):
+            return whisper_model
+        WHISPER_STATE = "loading"
+        try:
+            import whisper
+            # load a lightweight model initially for speed; set WHISPER_MODEL=tiny if required
+            load_start = time.perf_counter()
+            whisper_model = whisper.load_model(WHISPER_MODEL_NAME)
+            set_gauge("echoverse_model_load_seconds", time.perf_counter() - load_start, model=f"whisper-{WHISPER_MODEL_NAME}")
+            WHISPER_AVAILABLE = True
+            WHISPER_STATE = "ready"
+        except Exception as e:
+            WHISPER_STATE = "unavailable"
+            print("Whisper not available:", e)
+    return whisper_model
+
+def disable_whisper():
+    """This process never loads Whisper (STT_ENGINE=stub): requests get whisper_unavailable, not model_loading."""
+    global WHISPER_STATE
+    with _WHISPER_LOCK:
+        if WHISPER_STATE == "pending":
+            WHISPER_STATE = "disabled"
+
+def load_on_demand():
+    """Warm-up won't load Whisper; load it in the first request that needs it instead."""
+    global _LOAD_ON_DEMAND
+    _LOAD_ON_DEMAND = True
+
+def get_whisper_model():
+    return whisper_model
+
+def whisper_loading():
+    if WHISPER_STATE == "pending" and _LOAD_ON_DEMAND:
+        load_whisper()
+    return WHISPER_STATE in ("pending", "loading")
+
+def model_loading_response():
+    resp = jsonify({"error": "model_loading", "model": f"whisper-{WHISPER_MODEL_NAME}"})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = "5"
+    return resp
+
+# Smaller model for degraded (overload) mode, loaded in the background on first use
+_degraded_model = None
+_degraded_loading = False
+_DEGRADED_LOCK = threading.Lock()
+
+def _load_degraded_model():
+    global _degraded_model, _degraded_loading
+    try:
+        import whisper
+        load_start = time.perf_counter()
+        model = whisper.load_model(DEGRADED_WHISPER_MODEL)
+        set_gauge("echoverse_model_load_seconds", time.perf_counter() - load_start, model=f"whisper-{DEGRADED_WHISPER_MODEL}")
+        _degraded_model = model
+    except Exception as e:
+        print("Degraded whisper model not available:", e)
+    finally:
+        _degraded_loading = False
+
+def get_degraded_model():
+    """Return the degraded-mode model, or None while it is (being) loaded or disabled."""
+    global _degraded_loading
+    if not WHISPER_AVAILABLE or not DEGRADED_WHISPER_MODEL or _degraded_model is not None:
+        return _degraded_model
+    with _DEGRADED_LOCK:
+        if not _degraded_loading and _degraded_model is None:
+            _degraded_loading = True
+            threading.Thread(target=_load_degraded_model, daemon=True).start()
+    return None
 
 stt_bp = Blueprint("stt", __name__)
 
@@ -24,38 +104,48 @@ def allowed_file(filename):
     return ext in ALLOWED_EXT
 
 @stt_bp.route("/stt", methods=["POST"])
+@admit(stt_admission)
+@streaming_decode
 def stt():
     """
     Accepts multipart/form-data with a file field named 'file' (audio).
     Returns JSON: { transcript: "...", lang: "en", duration: 3.2 }
     """
-    if "file" not in request.files:
+    # admit() already streamed the file into a per-upload scratch dir (and into ffmpeg)
+    files = request.files
+    if "file" not in files:
         return jsonify({"error": "no_file"}), 400
 
-    f = request.files["file"]
+    f = files["file"]
     filename = secure_filename(f.filename or "upload.wav")
     if not allowed_file(filename):
         return jsonify({"error": "invalid_file_type"}), 400
-
-    # Save to temp file
-    tmp_dir = tempfile.gettempdir()
-    tmp_path = os.path.join(tmp_dir, filename)
-    f.save(tmp_path)
+    upload = get_upload(f)
+    if whisper_loading():
+        return model_loading_response()
 
     # If Whisper is installed and loaded, use it to transcribe
     if WHISPER_AVAILABLE and whisper_model is not None:
         try:
-            # you can pass language param if known: whisper_model.transcribe(tmp_path, language="hi")
-            result = whisper_model.transcribe(tmp_path, fp16=False)  # fp16 False on CPU
+            with timed("decode"):
+                pcm = upload.pcm()
+            # decoded length, as on /api/chunk (segment ends miss trailing silence)
+            inc("echoverse_audio_seconds_total", len(pcm) / float(SAMPLE_RATE * 2), endpoint="stt")
+            # retried uploads of the same audio are answered from the dedup cache
+            cache_key = audio_key(pcm, WHISPER_MODEL_NAME, endpoint="stt")
+            cached = transcript_cache.get(cache_key)
+            if cached is not None:
+                return jsonify({**cached, "cached": True}), 200
+            # you can pass language param if known: whisper_model.transcribe(audio, language="hi")
+            with timed("whisper"):
+                # already 16 kHz mono: hand Whisper the samples so it doesn't run ffmpeg again
+                result = whisper_model.transcribe(pcm_to_audio(pcm), fp16=False)  # fp16 False on CPU
             transcript = result.get("text", "").strip()
             # Optionally get detected language:
             lang = result.get("language", None)
-            # Clean up temp file
-            try:
-                os.remove(tmp_path)
-            except:
-                pass
-            return jsonify({"transcript": transcript, "language": lang, "raw_result": result}), 200
+            body = {"transcript": transcript, "language": lang, "raw_result": result}
+            transcript_cache.put(cache_key, body)
+            return jsonify(body), 200
         except Exception as e:
             return jsonify({"error": "whisper_failed", "detail": str(e)}), 500
     else:
@@ -63,5 +153,5 @@ def stt():
         return jsonify({
             "transcript": "(whisper not available on server)",
             "note": "saved_temp_file",
-            "temp_path": tmp_path
+            "temp_path": upload.detach()
         }), 200
@@ -0,0 +1,89 @@
+# server/tests/test_admission.py
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("flask")
+os.environ.setdefault("METRICS_ENABLED", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController, Overloaded  # noqa: E402
+
+
+def _controller(concurrency=2, per_user=1, queue_size=2, queue_timeout=1.0):
+    return AdmissionController("test", concurrency, per_user, queue_size, queue_timeout)
+
+
+def test_per_user_limit_rejects_without_queueing():
+    c = _controller()
+    c.acquire("a")
+    with pytest.raises(Overloaded) as e:
+        c.acquire("a")
+    assert e.value.reason == "per_user_limit"
+    assert c.waiting == 0
+    with pytest.raises(Overloaded):
+        c.check("a")
+    c.acquire("b")   # another user still gets the second slot
+    assert c.active == 2
+
+
+def test_queue_full_and_check():
+    c = _controller(concurrency=1, per_user=0, queue_size=0)
+    c.acquire("a")
+    with pytest.raises(Overloaded) as e:
+        c.check("b")
+    assert e.value.reason == "queue_full"
+    with pytest.raises(Overloaded) as e:
+        c.acquire("b")
+    assert e.value.reason == "queue_full"
+
+
+def test_queue_timeout_and_no_wait():
+    c = _controller(concurrency=1, per_user=0, queue_timeout=0.05)
+    c.acquire("a")
+    start = time.perf_counter()
+    with pytest.raises(Overloaded) as e:
+        c.acquire("b")
+    assert e.value.reason == "queue_timeout"
+    assert 0.04 <= time.perf_counter() - start < 1.0
+    with pytest.raises(Overloaded):
+        c.acquire("b", timeout=0)
+    assert c.waiting == 0
+
+
+def test_queued_request_runs_after_release():
+    c = _controller(concurrency=1, per_user=0)
+    acquired_at = c.acquire("a")
+    got = []
+    t = threading.Thread(target=lambda: got.append(c.acquire("b")))
+    t.start()
+    deadline = time.time() + 1
+    while c.waiting == 0 and time.time() < deadline:
+        time.sleep(0.005)
+    assert c.waiting == 1 and c.overloaded(threshold=1)
+    c.release("a", acquired_at)
+    t.join(1)
+    assert got and c.active == 1 and c.waiting == 0
+
+
+def test_retry_after_grows_with_backlog():
+    c = _controller(concurrency=1, per_user=0, queue_size=4, queue_timeout=5.0)
+    c._service_time = 2.0
+    c.acquire("a")
+    with pytest.raises(Overloaded) as e:
+        c.acquire("b", timeout=0)
+    first = e.value.retry_after
+    threads = [threading.Thread(target=lambda: pytest.raises(Overloaded, c.acquire, "q", 0.3)) for _ in range(3)]
+    for t in threads:
+        t.start()
+    deadline = time.time() + 1
+    while c.waiting < 3 and time.time() < deadline:
+        time.sleep(0.005)
+    with pytest.raises(Overloaded) as e:
+        c.acquire("b", timeout=0)
+    assert first >= 1 and e.value.retry_after > first
+    for t in threads:
+        t.join(1)
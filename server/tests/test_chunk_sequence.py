@@ -0,0 +1,86 @@
+# server/tests/test_chunk_sequence.py
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("flask")
+os.environ.setdefault("STT_ENGINE", "stub")
+os.environ.setdefault("METRICS_ENABLED", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify, make_response  # noqa: E402
+import chunk_stream  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def _counting_view(calls):
+    def view():
+        calls.append(1)
+        return jsonify({"status": "final", "transcript": "ok"}), 200
+    return chunk_stream.sequenced(view)
+
+
+def _post(app, view, session_id, seq):
+    with app.test_request_context(f"/api/chunk?session_id={session_id}&seq={seq}", method="POST"):
+        return make_response(view())
+
+
+def test_retry_of_a_waiting_chunk_is_not_processed_twice(app, monkeypatch):
+    monkeypatch.setattr(chunk_stream, "CHUNK_REORDER_WAIT", 5.0)
+    calls = []
+    view = _counting_view(calls)
+    results = {}
+
+    # seq 1 overtakes seq 0 and waits for it
+    waiter = threading.Thread(target=lambda: results.setdefault("first", _post(app, view, "s-wait", 1)))
+    waiter.start()
+    deadline = time.time() + 2
+    while time.time() < deadline:
+        with chunk_stream._LOCK:
+            state = chunk_stream._SEQUENCES.get("s-wait")
+            if state and 1 in state["in_flight"]:
+                break
+        time.sleep(0.01)
+
+    retry = _post(app, view, "s-wait", 1)
+    assert retry.status_code == 409
+    assert retry.get_json()["error"] == "chunk_in_progress"
+
+    assert _post(app, view, "s-wait", 0).status_code == 200
+    waiter.join(5)
+    assert results["first"].status_code == 200
+    assert len(calls) == 2          # seq 0 and seq 1, once each
+
+    again = _post(app, view, "s-wait", 1)
+    assert again.get_json()["duplicate"] is True
+    assert len(calls) == 2
+
+
+def test_sequencing_survives_a_buffer_flush(app):
+    calls = []
+    view = _counting_view(calls)
+    assert _post(app, view, "s-flush", 0).status_code == 200
+
+    # /api/flush drops the buffer and its meta; the sequencing state must stay
+    chunk_stream._append_to_buffer("s-flush", b"\x00\x00" * 160)
+    path, _ = chunk_stream._flush_buffer("s-flush")
+    if path:
+        os.remove(path)
+    with chunk_stream._LOCK:
+        chunk_stream._BUFFERS_META.pop("s-flush", None)
+
+    retry = _post(app, view, "s-flush", 0)
+    assert retry.status_code == 200 and retry.get_json()["duplicate"] is True
+    assert len(calls) == 1
+
+    start = time.time()
+    assert _post(app, view, "s-flush", 1).status_code == 200
+    assert time.time() - start < chunk_stream.CHUNK_REORDER_WAIT   # next seq doesn't wait for a reset "next"
+    assert len(calls) == 2
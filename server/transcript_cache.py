@@ -0,0 +1,98 @@
+# server/transcript_cache.py
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from config import TRANSCRIPT_CACHE_MAX_ENTRIES, TRANSCRIPT_CACHE_MAX_BYTES, TRANSCRIPT_CACHE_TTL
+from metrics import inc, register_gauge
+
+
+def audio_key(pcm_bytes, model, **options):
+    """
+    Cache key for a transcription: hash of the decoded PCM (so re-encoded or renamed
+    retries of the same audio still match) plus the model and every option that
+    changes the output (language, tgt_lang, ...).
+    """
+    h = hashlib.sha256()
+    h.update(pcm_bytes)
+    h.update(b"\0")
+    h.update(json.dumps({"model": model, **options}, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class TranscriptCache:
+    """Thread-safe LRU with TTL expiry, bounded by entry count and approximate payload bytes."""
+
+    def __init__(self, name, max_entries, max_bytes, ttl):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at, size, value)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        inc("echoverse_cache_requests_total", cache=self.name, result="hit" if entry else "miss")
+        return entry[2] if entry else None
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        evicted = 0
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.time() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                evicted += 1
+        if evicted:
+            inc("echoverse_cache_evictions_total", evicted, cache=self.name)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e[0] < now]:
+                self._drop(key)
+
+    def _drop(self, key):
+        # caller must hold self._lock
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+transcript_cache = TranscriptCache("transcript", TRANSCRIPT_CACHE_MAX_ENTRIES, TRANSCRIPT_CACHE_MAX_BYTES, TRANSCRIPT_CACHE_TTL)
+
+register_gauge("echoverse_transcript_cache_entries", lambda: transcript_cache.stats()["entries"], "Entries in the transcript dedup cache")
+register_gauge("echoverse_transcript_cache_bytes", lambda: transcript_cache.stats()["bytes"], "Approximate payload bytes in the transcript dedup cache")
+register_gauge("echoverse_transcript_cache_hit_rate", lambda: transcript_cache.stats()["hit_rate"], "Lifetime hit rate of the transcript dedup cache")
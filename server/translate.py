@@ -1,7 +1,8 @@
 # server/translate.py
-from transformers import MarianMTModel, MarianTokenizer
 from typing import Optional
 import threading
+import time
+from metrics import set_gauge
 
 # Simple thread-safe cache
 _MODEL_LOCK = threading.Lock()
@@ -26,6 +27,31 @@ MARIAN_MAP = {
     # "bn": {"hi": "Helsinki-NLP/opus-mt-bn-hi"}, etc.
 }
 
+TRANSFORMERS_STATE = "pending"   # pending | ready | unavailable
+
+def _marian_classes():
+    # transformers (and torch) take seconds to import; defer until first use / warm-up
+    global TRANSFORMERS_STATE
+    try:
+        from transformers import MarianMTModel, MarianTokenizer
+    except Exception:
+        TRANSFORMERS_STATE = "unavailable"
+        raise
+    TRANSFORMERS_STATE = "ready"
+    return MarianMTModel, MarianTokenizer
+
+def loaded_models():
+    with _MODEL_LOCK:
+        return sorted(_MODEL_CACHE)
+
+def warmup(pairs):
+    """Import transformers and preload the given "src-tgt" Marian pairs (called from warmup.py)."""
+    _marian_classes()
+    for pair in pairs:
+        src, _, tgt = pair.partition("-")
+        if src and tgt:
+            get_marian_model(src, tgt)
+
 def get_marian_model(src: str, tgt: str):
     key = f"{src}-{tgt}"
     with _MODEL_LOCK:
@@ -37,8 +63,11 @@ def get_marian_model(src: str, tgt: str):
             model_id = MARIAN_MAP[src][tgt]
         # If direct model not found, try src->en and then en->tgt (pivot) — we will do pivot translation in caller
         if model_id:
+            MarianMTModel, MarianTokenizer = _marian_classes()
+            load_start = time.perf_counter()
             tokenizer = MarianTokenizer.from_pretrained(model_id)
             model = MarianMTModel.from_pretrained(model_id)
+            set_gauge("echoverse_model_load_seconds", time.perf_counter() - load_start, model=model_id)
             _MODEL_CACHE[key] = (tokenizer, model)
             return tokenizer, model
         return None
@@ -0,0 +1,319 @@
+# server/uploads.py
+import io
+import os
+import math
+import wave
+import shutil
+import functools
+import tempfile
+import subprocess
+from flask import Request, current_app, after_this_request
+from werkzeug.utils import secure_filename
+from metrics import inc
+
+SAMPLE_RATE = 16000
+
+# In-process resampler: Kaiser-windowed sinc low-pass, applied polyphase at the exact
+# rational rate ratio (48k -> 16k is 1/3, 44.1k -> 16k is 160/441)
+RESAMPLE_ZERO_CROSSINGS = 32     # filter half-length, in zero crossings of the sinc
+RESAMPLE_ROLLOFF = 0.945         # passband edge as a fraction of the lower Nyquist
+RESAMPLE_KAISER_BETA = 8.6       # ~ -85 dB stopband
+RESAMPLE_BLOCK = 4096            # output samples computed per vectorized step
+
+# Containers ffmpeg can decode from a pipe while bytes are still arriving.
+# MP4-family files (.m4a/.caf/.mp4) usually keep their index at the end, so they
+# are spooled to disk first and decoded once the upload completes.
+PIPE_DECODABLE_EXTS = {".wav", ".mp3", ".ogg", ".flac", ".aac", ".webm"}
+
+
+def ffmpeg_cmd(src, dst, target_rate=SAMPLE_RATE):
+    return [
+        "ffmpeg", "-y", "-i", src,
+        "-ar", str(target_rate),
+        "-ac", "1",
+        "-sample_fmt", "s16",
+        dst
+    ]
+
+
+def decode_file_to_wav(src_path, wav_path, target_rate=SAMPLE_RATE):
+    try:
+        subprocess.run(ffmpeg_cmd(src_path, wav_path, target_rate), check=True,
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"ffmpeg failed: {e.stderr.decode('utf-8', errors='ignore')}")
+    return wav_path
+
+
+def read_wav_pcm(wav_path):
+    with wave.open(wav_path, 'rb') as wf:
+        return wf.readframes(wf.getnframes())
+
+
+def is_wav_header(head):
+    return len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WAVE"
+
+
+def is_container_header(head):
+    """Magic bytes of the compressed containers clients send (mp3, ogg, flac, mp4/m4a, caf, webm, adts)."""
+    return (head[:3] == b"ID3" or head[:4] in (b"OggS", b"fLaC", b"caff", b"\x1aE\xdf\xa3")
+            or head[4:8] == b"ftyp"
+            or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0))   # MPEG / ADTS frame sync
+
+
+def decode_bytes(data, target_rate=SAMPLE_RATE):
+    """Mono s16le PCM from an in-memory file, via the same in-process/ffmpeg paths as uploads."""
+    sink = UploadSink()
+    try:
+        sink.write(data)
+        return sink.pcm(target_rate)
+    finally:
+        sink.cleanup()
+
+
+def parse_wav_bytes(data):
+    """
+    Parse an in-memory WAV container. Returns (pcm_s16le, sample_rate, channels).
+    Raises ValueError for anything but 16-bit PCM, so callers can fall back to ffmpeg.
+    """
+    try:
+        with wave.open(io.BytesIO(data), 'rb') as wf:
+            if wf.getsampwidth() != 2:
+                raise ValueError(f"unsupported sample width: {wf.getsampwidth()}")
+            return wf.readframes(wf.getnframes()), wf.getframerate(), wf.getnchannels()
+    except (wave.Error, EOFError) as e:
+        raise ValueError(f"unsupported wav: {e}")
+
+
+@functools.lru_cache(maxsize=4)
+def _resample_filter(up, down):
+    """
+    Polyphase bank for resampling by up/down: row p holds the taps for output samples that
+    fall p/up of the way between two input samples. Returns (bank (up, 2*half) float32, half).
+    """
+    import numpy as np
+    cutoff = 0.5 * min(1.0, up / down) * RESAMPLE_ROLLOFF       # cycles per input sample
+    half = int(math.ceil(RESAMPLE_ZERO_CROSSINGS / (2 * cutoff)))
+    # distance from each output position to input taps floor(pos) - half + 1 .. floor(pos) + half
+    d = np.arange(-half + 1, half + 1)[None, :] - (np.arange(up) / up)[:, None]
+    window = np.i0(RESAMPLE_KAISER_BETA * np.sqrt(np.clip(1 - (d / half) ** 2, 0, None))) / np.i0(RESAMPLE_KAISER_BETA)
+    bank = 2 * cutoff * np.sinc(2 * cutoff * d) * window
+    bank /= bank.sum(axis=1, keepdims=True)    # unity DC gain in every phase
+    return bank.astype(np.float32), half
+
+
+def resample(x, sample_rate, target_rate=SAMPLE_RATE):
+    """Band-limited resampling of a float32 mono signal (windowed-sinc low-pass below both Nyquists)."""
+    import numpy as np
+    g = math.gcd(sample_rate, target_rate)
+    up, down = target_rate // g, sample_rate // g
+    bank, half = _resample_filter(up, down)
+    n_out = int(round(len(x) * up / down))
+    padded = np.concatenate([np.zeros(half, np.float32), x, np.zeros(half + 1, np.float32)])
+    taps = np.arange(1, 2 * half + 1)
+    out = np.empty(n_out, dtype=np.float32)
+    for start in range(0, n_out, RESAMPLE_BLOCK):
+        pos = np.arange(start, min(start + RESAMPLE_BLOCK, n_out), dtype=np.int64) * down
+        windows = padded[(pos // up)[:, None] + taps[None, :]]
+        out[start:start + len(pos)] = np.einsum("ij,ij->i", windows, bank[pos % up])
+    return out
+
+
+def to_pipeline_pcm(pcm_bytes, sample_rate, channels, target_rate=SAMPLE_RATE):
+    """Downmix interleaved s16le PCM to mono and resample to target_rate, in-process (no ffmpeg)."""
+    import numpy as np
+    frame_bytes = 2 * channels
+    usable = len(pcm_bytes) - len(pcm_bytes) % frame_bytes
+    if channels == 1 and sample_rate == target_rate:
+        return bytes(pcm_bytes[:usable])
+    x = np.frombuffer(pcm_bytes[:usable], dtype="<i2").astype(np.float32)
+    if channels > 1:
+        x = x.reshape(-1, channels).mean(axis=1)
+    if sample_rate != target_rate and len(x):
+        x = resample(x, sample_rate, target_rate)
+    return np.clip(np.round(x), -32768, 32767).astype("<i2").tobytes()
+
+
+def pcm_to_audio(pcm_bytes):
+    """16-bit PCM -> float32 numpy array, the form whisper_model.transcribe accepts directly."""
+    import numpy as np
+    return np.frombuffer(pcm_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+class UploadSink:
+    """
+    File-like target for werkzeug's multipart parser. Every upload gets its own
+    scratch directory (no collisions between concurrent uploads with the same
+    client filename). Bytes go to disk as they arrive, so memory per request is
+    bounded by the parser's read size; when decode=True and the container allows
+    it, the same bytes are also piped into ffmpeg so decoding overlaps the transfer.
+    WAV uploads (sniffed from the RIFF header, not the extension) skip ffmpeg and
+    are converted in-process by pcm().
+    """
+
+    def __init__(self, filename=None, decode=False):
+        self.filename = secure_filename(filename or "") or "upload"
+        self.ext = os.path.splitext(self.filename)[1].lower()
+        self.scratch_dir = tempfile.mkdtemp(prefix="echoverse-upload-")
+        self.path = os.path.join(self.scratch_dir, "source" + self.ext)
+        self.wav_path = os.path.join(self.scratch_dir, "decoded.wav")
+        self.bytes_received = 0
+        self._fh = open(self.path, "w+b")
+        self._proc = None
+        self._stderr = None
+        self._stream_failed = False
+        self._keep = False
+        self._decode = decode
+        self._head = b""          # first bytes, kept until the container is sniffed
+        self._sniffed = False
+        self.is_wav = False
+
+    def _start_decoder(self):
+        self._stderr = open(os.path.join(self.scratch_dir, "ffmpeg.log"), "w+b")
+        try:
+            self._proc = subprocess.Popen(ffmpeg_cmd("pipe:0", self.wav_path), stdin=subprocess.PIPE,
+                                          stdout=subprocess.DEVNULL, stderr=self._stderr)
+        except OSError:
+            self._proc = None
+            self._stream_failed = True
+
+    def _sniff(self):
+        self._sniffed = True
+        self.is_wav = is_wav_header(self._head)
+        if self._decode and not self.is_wav and self.ext in PIPE_DECODABLE_EXTS:
+            self._start_decoder()
+            self._pipe(self._head)
+        self._head = b""
+
+    def _pipe(self, data):
+        if self._proc is not None and not self._stream_failed:
+            try:
+                self._proc.stdin.write(data)
+            except (BrokenPipeError, OSError):
+                # decoder gave up early; finish() falls back to decoding the spooled file
+                self._stream_failed = True
+
+    # --- file protocol used by werkzeug / FileStorage ---
+    def write(self, data):
+        self._fh.write(data)
+        self.bytes_received += len(data)
+        if not self._sniffed:
+            self._head += bytes(data)
+            if len(self._head) >= 12:
+                self._sniff()
+            return len(data)
+        self._pipe(data)
+        return len(data)
+
+    def read(self, *args):
+        return self._fh.read(*args)
+
+    def seek(self, *args):
+        return self._fh.seek(*args)
+
+    def tell(self):
+        return self._fh.tell()
+
+    def flush(self):
+        self._fh.flush()
+
+    def close(self):
+        if not self._fh.closed:
+            self._fh.close()
+
+    @property
+    def closed(self):
+        return self._fh.closed
+
+    # --- pipeline helpers ---
+    def finish(self, target_rate=SAMPLE_RATE):
+        """Wait for decoding to complete and return the path of a 16 kHz mono s16 WAV."""
+        self._fh.flush()
+        if not self._sniffed:
+            self._sniff()
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+            except (BrokenPipeError, OSError):
+                self._stream_failed = True
+            rc = self._proc.wait()
+            self._proc = None
+            if rc == 0 and not self._stream_failed and target_rate == SAMPLE_RATE:
+                return self.wav_path
+        return decode_file_to_wav(self.path, self.wav_path, target_rate)
+
+    def pcm(self, target_rate=SAMPLE_RATE):
+        """Mono s16le PCM at target_rate. WAV is parsed and resampled in-process; the rest goes through ffmpeg."""
+        self._fh.flush()
+        if not self._sniffed:
+            self._sniff()
+        if self.is_wav:
+            with open(self.path, "rb") as fh:
+                data = fh.read()
+            try:
+                pcm, rate, channels = parse_wav_bytes(data)
+                inc("echoverse_decode_total", path="inprocess")
+                return to_pipeline_pcm(pcm, rate, channels, target_rate)
+            except ValueError:
+                pass  # e.g. float / 24-bit WAV: let ffmpeg handle it
+        inc("echoverse_decode_total", path="ffmpeg")
+        return read_wav_pcm(self.finish(target_rate))
+
+    def detach(self):
+        """Keep the spooled source file after the request ends and return its path."""
+        self._keep = True
+        self.close()
+        return self.path
+
+    def cleanup(self):
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+        if self._stderr is not None:
+            self._stderr.close()
+        self.close()
+        if not self._keep:
+            shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+
+class StreamingRequest(Request):
+    """
+    Request class that hands multipart file parts to an UploadSink. Views decorated
+    with @streaming_decode start ffmpeg on the first bytes of the upload.
+    Scratch directories are removed when Flask closes the request.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        view = current_app.view_functions.get(self.endpoint) if self.endpoint else None
+        sink = UploadSink(filename, decode=getattr(view, "streaming_decode", False))
+        self.__dict__.setdefault("_upload_sinks", []).append(sink)
+        return sink
+
+    def close(self):
+        for sink in self.__dict__.pop("_upload_sinks", []):
+            sink.cleanup()
+        super().close()
+
+
+def streaming_decode(view):
+    """Mark a view so its uploads are decoded while the request body is still arriving."""
+    view.streaming_decode = True
+    return view
+
+
+def get_upload(file_storage):
+    """
+    Return the UploadSink backing an uploaded file. Falls back to copying the stream
+    into a fresh sink when the app is not using StreamingRequest.
+    """
+    if isinstance(file_storage.stream, UploadSink):
+        return file_storage.stream
+    sink = UploadSink(file_storage.filename)
+    shutil.copyfileobj(file_storage.stream, sink)
+
+    @after_this_request
+    def _cleanup(response):
+        sink.cleanup()
+        return response
+    return sink
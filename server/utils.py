@@ -1,7 +1,9 @@
 # server/utils.py
+import hmac
 from functools import wraps
 from flask import request, jsonify
 from models import get_token
+from config import ADMIN_TOKEN
 
 def require_bearer(f):
     @wraps(f)
@@ -17,3 +19,20 @@ def require_bearer(f):
         request.user_id = t["user_id"]
         return f(*args, **kwargs)
     return decorated
+
+def admin_token_valid(req):
+    # Admin endpoints are disabled entirely unless ADMIN_TOKEN is configured
+    if not ADMIN_TOKEN:
+        return False
+    supplied = req.headers.get("X-Admin-Token", "")
+    return hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+
+def require_admin(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({"error": "admin_disabled"}), 404
+        if not admin_token_valid(request):
+            return jsonify({"error": "forbidden"}), 403
+        return f(*args, **kwargs)
+    return decorated
@@ -0,0 +1,113 @@
+# server/warmup.py
+import time
+import threading
+from flask import Blueprint, jsonify
+from config import WARMUP_TRANSLATION_PAIRS, READY_REQUIRES_TRANSLATION, STT_ENGINE, WARMUP_ENABLED
+import stt
+import translate
+import models
+import chunk_stream
+
+health_bp = Blueprint("health", __name__)
+
+_STARTED_AT = time.time()
+_LOCK = threading.Lock()
+_COMPONENTS = {}   # name -> { "state": pending|loading|ready|unavailable|disabled|on_demand, "seconds": float, "error": str }
+_started = False
+
+
+def _set(name, **fields):
+    with _LOCK:
+        _COMPONENTS.setdefault(name, {"state": "pending"}).update(fields)
+
+
+def _load_whisper():
+    stt.load_whisper()
+    if stt.WHISPER_STATE != "ready":
+        raise RuntimeError("whisper could not be loaded")
+
+
+def _run_step(name, fn):
+    _set(name, state="loading")
+    start = time.perf_counter()
+    try:
+        fn()
+        _set(name, state="ready", seconds=round(time.perf_counter() - start, 3))
+    except Exception as e:
+        _set(name, state="unavailable", seconds=round(time.perf_counter() - start, 3), error=str(e))
+        print(f"[WARMUP] {name} failed:", e)
+
+
+STEPS = [
+    ("whisper", _load_whisper),
+    ("translation", lambda: translate.warmup(WARMUP_TRANSLATION_PAIRS)),
+    ("mongo", models.ping),
+]
+
+
+def _enabled_steps():
+    if not WARMUP_ENABLED:
+        return []
+    # the stub engine never touches Whisper, so don't import torch or fetch weights for it
+    return [(name, fn) for name, fn in STEPS if not (name == "whisper" and STT_ENGINE == "stub")]
+
+
+def start():
+    """
+    Kick off background warm-up (idempotent). Each component loads in its own daemon
+    thread so a slow Mongo connect doesn't hold up Whisper, and the HTTP listener
+    never waits on any of them.
+    """
+    global _started
+    steps = _enabled_steps()
+    with _LOCK:
+        if _started:
+            return
+        _started = True
+        for name, _ in STEPS:
+            _COMPONENTS[name] = {"state": "pending" if any(name == n for n, _ in steps) else "disabled"}
+        if not any(name == "whisper" for name, _ in steps):
+            if STT_ENGINE == "stub":
+                # /api/stt and /api/process answer whisper_unavailable instead of model_loading forever
+                stt.disable_whisper()
+            else:
+                stt.load_on_demand()
+                _COMPONENTS["whisper"]["state"] = "on_demand"
+    chunk_stream.start_cleanup_worker()
+    for name, fn in steps:
+        threading.Thread(target=_run_step, args=(name, fn), daemon=True, name=f"warmup-{name}").start()
+
+
+def status():
+    with _LOCK:
+        components = {name: dict(info) for name, info in _COMPONENTS.items()}
+    whisper = components.setdefault("whisper", {})
+    if whisper.get("state") in ("disabled", "on_demand") and stt.WHISPER_STATE not in ("pending", "disabled"):
+        whisper["state"] = stt.WHISPER_STATE   # loaded by a request rather than by warm-up
+    translation = components.setdefault("translation", {})
+    translation["models"] = translate.loaded_models()
+    translation["transformers"] = translate.TRANSFORMERS_STATE
+    return components
+
+
+def is_ready(components=None):
+    components = components or status()
+    required = [] if STT_ENGINE == "stub" else ["whisper"]
+    if READY_REQUIRES_TRANSLATION:
+        required.append("translation")
+    # on_demand: warm-up is off and the first request loads Whisper, so there is nothing to wait for
+    return all(components.get(name, {}).get("state") in ("ready", "on_demand") for name in required)
+
+
+@health_bp.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness: the process is up and serving HTTP."""
+    return jsonify({"status": "ok", "uptime_s": round(time.time() - _STARTED_AT, 3)})
+
+
+@health_bp.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness: required models are loaded; 503 until then."""
+    components = status()
+    ready = is_ready(components)
+    return jsonify({"ready": ready, "components": components}), (200 if ready else 503)